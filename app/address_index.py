@@ -0,0 +1,121 @@
+import threading
+import time
+
+import redis
+from flask import current_app
+
+from .models import Accounts, db
+from .config import config
+from .logging import logger
+
+
+class AddressIndex:
+    """
+    In-memory set of our account addresses as raw 20 bytes.
+
+    It is loaded from DB once and then only new rows (by id) are read.
+    Addresses created by other processes come through Redis pub/sub,
+    see publish_new_address(). Membership test takes bytes or any-case hex
+    string and does not need checksum conversion.
+    """
+
+    def __init__(self):
+        self.addresses = set()
+        # append-only copy for iterating while new addresses are added
+        self.ordered = []
+        self.last_id = 0
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, address):
+        if isinstance(address, str):
+            try:
+                address = bytes.fromhex(address[2:])
+            except ValueError:
+                return False
+        return address in self.addresses
+
+    def __len__(self):
+        return len(self.ordered)
+
+    def __iter__(self):
+        return iter(self.ordered)
+
+    def since(self, position):
+        """Addresses added after the first `position` ones"""
+        return self.ordered[position:]
+
+    def add(self, address):
+        if isinstance(address, str):
+            address = bytes.fromhex(address[2:])
+        with self.lock:
+            if address not in self.addresses:
+                self.addresses.add(address)
+                self.ordered.append(address)
+                self.version += 1
+
+    def load(self):
+        """Read accounts added to DB since the last load"""
+        tries = 3
+        for i in range(tries):
+            try:
+                rows = Accounts.query.filter(Accounts.id > self.last_id).with_entities(
+                    Accounts.id, Accounts.address).order_by(Accounts.id).yield_per(10000)
+                for row in rows:
+                    self.add(row.address)
+                    self.last_id = row.id
+                db.session.close()
+            except:
+                db.session.rollback()
+                if i < tries - 1: # i is zero indexed
+                    continue
+                else:
+                    raise Exception("There was exception during query to the database, try again later")
+            break
+
+    def listen(self, app):
+        """Add addresses published by other processes, reload from DB on reconnects and periodically"""
+        app.app_context().push()
+        while True:
+            try:
+                pubsub = redis.Redis.from_url(f'redis://{config["REDIS_HOST"]}').pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(config['ADDRESS_INDEX_CHANNEL'])
+                # catch up with addresses created while we were not subscribed
+                self.load()
+                loaded_at = time.time()
+                while True:
+                    message = pubsub.get_message(timeout=1)
+                    if message:
+                        self.add(message['data'].decode())
+                    if time.time() - loaded_at > config['ADDRESS_INDEX_RELOAD_SECONDS']:
+                        self.load()
+                        loaded_at = time.time()
+            except Exception as e:
+                logger.warning(f"Address index subscription failed: {e}")
+                time.sleep(10)
+
+
+address_index = None
+address_index_lock = threading.Lock()
+
+
+def get_address_index():
+    """Process-wide AddressIndex, loaded and subscribed to updates on the first call"""
+    global address_index
+    with address_index_lock:
+        if address_index is None:
+            index = AddressIndex()
+            index.load()
+            threading.Thread(daemon=True, name="Address index listener", target=index.listen,
+                             args=(current_app._get_current_object(),)).start()
+            address_index = index
+    return address_index
+
+
+def publish_new_address(address):
+    """Tell all processes about a new account, the DB row should be already committed"""
+    try:
+        redis.Redis.from_url(f'redis://{config["REDIS_HOST"]}').publish(config['ADDRESS_INDEX_CHANNEL'], address)
+    except Exception as e:
+        # other processes will read it from DB on the next reload
+        logger.warning(f"Cannot publish new address {address}: {e}")
@@ -34,6 +34,6 @@ def handle_exception(e):
     logger.warn(f"Exception: {traceback.format_exc()}")
     return {"status": "error", "msg": str(e)}
 
-from . import payout, views, metrics
+from . import payout, metrics, views
 
 
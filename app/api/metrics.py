@@ -1,3 +1,14 @@
+from prometheus_client import generate_latest
+
+from . import metrics_blueprint
+
+
+@metrics_blueprint.get("/metrics")
+def get_metrics():
+    # block scanner gauges are updated by the scanner thread of this process
+    return generate_latest().decode()
+
+
 # import requests
 # import prometheus_client
 # from prometheus_client import generate_latest, Info, Gauge
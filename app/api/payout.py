@@ -2,7 +2,6 @@ from decimal import Decimal
 
 from flask import g, request
 from flask import current_app as app
-from web3 import Web3, HTTPProvider
 
 from .. import celery
 from ..tasks import make_multipayout 
@@ -12,6 +11,7 @@ from . import api
 from ..token import Token, Coin
 from ..logging import logger
 from ..config import config
+from ..rpc import get_w3
 
 
 @api.post('/calc-tx-fee/<decimal:amount>')
@@ -34,7 +34,7 @@ def calc_tx_fee(amount):
 
 @api.post('/multipayout')
 def multipayout():
-    w3 = Web3(HTTPProvider(config["FULLNODE_URL"], request_kwargs={'timeout': int(config['FULLNODE_TIMEOUT'])}))
+    w3 = get_w3()
     
     try:
         payout_list = request.get_json(force=True)
@@ -52,21 +52,26 @@ def multipayout():
         if not is_address:
             raise Exception(f"Bad destination address in {transfer}")
         try:
-            transfer['amount'] = Decimal(transfer['amount'])
+            transfer['amount'] = Decimal(str(transfer['amount']))
         except Exception as e:
             raise Exception(f"Bad amount in {transfer}: {e}")
 
         if transfer['amount'] <= 0:
             raise Exception(f"Payout amount should be a positive number: {transfer}")
         
+    # 'single' or 'disperse', PAYOUT_MODE if not given
+    mode = request.args.get('mode', config['PAYOUT_MODE'])
+    if mode not in ('single', 'disperse'):
+        raise Exception(f"Unknown payout mode {mode}, can be only 'single' or 'disperse'")
+
     coin_inst = Coin(config["COIN_SYMBOL"])
     max_fee = coin_inst.get_max_priority_fee()
 
     if g.symbol == config["COIN_SYMBOL"]:
-        task = (make_multipayout.s(g.symbol, payout_list, max_fee)).apply_async()
+        task = (make_multipayout.s(g.symbol, payout_list, max_fee, mode)).apply_async()
         return{'task_id': task.id}
     elif  g.symbol in config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys(): 
-        task = ( make_multipayout.s(g.symbol, payout_list, max_fee)).apply_async()
+        task = ( make_multipayout.s(g.symbol, payout_list, max_fee, mode)).apply_async()
         return {'task_id': task.id}
     else:
         raise Exception(f"{g.symbol} is not defined in config, cannot make payout")
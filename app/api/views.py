@@ -2,7 +2,7 @@ import json
 from decimal import Decimal
 
 from flask import current_app, g
-from web3 import Web3, HTTPProvider
+from web3 import Web3
 import decimal
 import requests
 
@@ -15,9 +15,12 @@ from ..logging import logger
 from . import api
 from app import create_app
 from ..unlock_acc import get_account_password
+from ..address_index import get_address_index, publish_new_address
+from ..internal_txs import get_internal_txs_detector
+from ..traces import trace_transaction
+from ..rpc import get_w3
 
-w3 = Web3(HTTPProvider(config["FULLNODE_URL"], 
-                       request_kwargs={'timeout': int(config['FULLNODE_TIMEOUT'])}))
+w3 = get_w3()
 
 w3l = Web3()
 
@@ -48,6 +51,7 @@ def generate_new_address():
             db.session.remove()
             db.engine.dispose() 
 
+    publish_new_address(acc.address)
     logger.info(f'Added new address and wallet added to DB')
     return {'status': 'success', 'address': acc.address}
 
@@ -78,7 +82,7 @@ def get_status():
 def get_transaction(txid):
     related_transactions = []
     
-    list_accounts = get_all_accounts()
+    list_accounts = get_address_index()
     if g.symbol == config["COIN_SYMBOL"]:
         try:
             transaction = w3.eth.get_transaction(txid)
@@ -99,6 +103,17 @@ def get_transaction(txid):
                 related_transactions.append([address, amount, confirmations, category])
             else:
                 logger.warning(f"Addresses in {txid} is not related to any SHKeeper addresses. Checking {txid} as a smartcontract internal transaction")
+                if config['INTERNAL_TXS_MODE'] == 'trace':
+                    # exact amounts from the call trace, no balance diffs needed
+                    confirmations = int(w3.eth.block_number) - int(transaction["blockNumber"])
+                    for acc_addr, value in trace_transaction(w3, txid, list_accounts):
+                        related_transactions.append([acc_addr, Decimal(w3.from_wei(value, "ether")), confirmations, 'receive'])
+                    if len(related_transactions) == 0:
+                        logger.warning(f"Did not find any internal transfers to our addresses in tx {txid}")
+                        return {'status': 'error', 'msg': 'txid is not related to any known address'}
+                    logger.warning(related_transactions)
+                    return related_transactions
+
                 block_num = int(transaction["blockNumber"])
                 block_eth_tx_addrs = []
 
@@ -112,12 +127,12 @@ def get_transaction(txid):
 
                 related_internal_addr = []
 
-                for acc_addr in list_accounts:
-                    if acc_addr[2:].lower() in transaction['input']:
-                        if acc_addr not in block_eth_tx_addrs:
-                            related_internal_addr.append(acc_addr)
-                        else:
-                            logger.warning(f"Found internal transaction to {acc_addr} but skip it because there was already a regular ARB transaction to {acc_addr} in {block_num} block")
+                for raw_addr in get_internal_txs_detector(list_accounts).find(transaction['input']):
+                    acc_addr = Web3.to_checksum_address(raw_addr)
+                    if acc_addr not in block_eth_tx_addrs:
+                        related_internal_addr.append(acc_addr)
+                    else:
+                        logger.warning(f"Found internal transaction to {acc_addr} but skip it because there was already a regular ARB transaction to {acc_addr} in {block_num} block")
                 
                 if len(related_internal_addr) > 0:
                     logger.warning(f"Found internal transactions to {related_internal_addr}")
@@ -138,7 +153,7 @@ def get_transaction(txid):
                         (tr['to'] not in token_addresses) and  # do not check internal tx to known token addresses and requested tx
                         tr['hash'].hex() != txid ):
                         for addr in related_internal_addr:
-                            if addr[2:].lower() in tr.input:
+                            if Web3.to_bytes(hexstr=addr) in tr.input:
                                 logger.warning(f"Found another internal transaction {tr['hash'].hex()} to our address {addr} in the same block, skip it!")
                                 addresses_in_another_txs.append(addr)
                 
@@ -181,20 +196,20 @@ def get_transaction(txid):
                     (token_instance.provider.to_checksum_address(transaction['from']) in list_accounts)):
                     address = token_instance.provider.to_checksum_address(transaction["from"])
                     category = 'internal'
-                    amount = Decimal(transaction["amount"]) / Decimal(10** (token_instance.contract.functions.decimals().call()))
+                    amount = token_instance.meta.from_units(transaction["amount"])
                     confirmations = int(w3.eth.block_number) - int(transaction["block_number"])
                     related_transactions.append([address, amount, confirmations, category])
 
                 elif token_instance.provider.to_checksum_address(transaction['to']) in list_accounts:
                     address = token_instance.provider.to_checksum_address(transaction["to"])
                     category = 'receive'
-                    amount = Decimal(transaction["amount"]) / Decimal(10** (token_instance.contract.functions.decimals().call()))
+                    amount = token_instance.meta.from_units(transaction["amount"])
                     confirmations = int(w3.eth.block_number) - int(transaction["block_number"])
                     related_transactions.append([address, amount, confirmations, category])
                 elif token_instance.provider.to_checksum_address(transaction['from']) in list_accounts:                
                     address = token_instance.provider.to_checksum_address(transaction["from"])
                     category = 'send'
-                    amount = Decimal(transaction["amount"]) / Decimal(10** (token_instance.contract.functions.decimals().call()))
+                    amount = token_instance.meta.from_units(transaction["amount"])
                     confirmations = int(w3.eth.block_number) - int(transaction["block_number"])
                     related_transactions.append([address, amount, confirmations, category])
             if not related_transactions:
@@ -0,0 +1,138 @@
+"""
+Rescan a range of blocks in parallel, without touching the scanner checkpoint.
+
+    python -m app.backfill --from 120000000 --to 121000000 --workers 8
+    python -m app.backfill --from 120000000 --to 121000000 --report found.jsonl
+
+The range is split into segments which are scanned by worker processes with
+the same fetching and matching code as the live scanner. Found transactions are
+de-duplicated by txid and added to the notification outbox, or written to a report.
+"""
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .config import config
+from .logging import logger
+
+
+worker = {}
+
+
+def _init_worker():
+    from app import create_app
+    from .address_index import AddressIndex
+    from .bloom import LogsBloomFilter
+    from .internal_txs import InternalTransfersDetector
+
+    app = create_app()
+    app.app_context().push()
+    # no pub/sub listener here, accounts are read once per worker
+    index = AddressIndex()
+    index.load()
+    logs_bloom = LogsBloomFilter()
+    logs_bloom.update_accounts(index)
+    internal_txs = None
+    if (config['INTERNAL_TXS_DETECTION'].lower() == 'true' and 
+        config['INTERNAL_TXS_MODE'] == 'input'):
+        internal_txs = InternalTransfersDetector()
+        internal_txs.update_accounts(index)
+    worker.update(app=app, index=index, logs_bloom=logs_bloom, internal_txs=internal_txs)
+
+
+def scan_segment(segment):
+    from .events import BatchSizeController, fetch_batch, match_batch
+    from .rpc import get_client
+
+    start_block, end_block = segment
+    client = get_client()
+    batch_size = BatchSizeController()
+    found = []
+    block_number = start_block
+    while block_number <= end_block:
+        last_batch_block = block_number + batch_size.next_size(end_block - block_number + 1) - 1
+        started = time.time()
+        try:
+            # blocks and logs of a batch come from one endpoint which has them, as in the live scanner
+            with client.pinned(last_batch_block):
+                responses, transfers, traces = fetch_batch(worker['logs_bloom'], worker['index'], block_number, last_batch_block)
+        except Exception as e:
+            if not batch_size.failed():
+                raise
+            logger.warning(f"Cannot get blocks {block_number} - {last_batch_block}: {e}. "
+                           f"Retrying with batch size {batch_size.size}")
+            continue
+        batch_size.done(last_batch_block - block_number + 1,
+                        time.time() - started,
+                        sum(len(block.transactions) for block in responses),
+                        end_block - last_batch_block)
+        # historical deposits are drained by refresh_balances, not here
+        found.extend(match_batch(responses, transfers, worker['index'], False, worker['internal_txs'], traces))
+        block_number = last_batch_block + 1
+    return start_block, end_block, found
+
+
+def backfill(from_block, to_block, workers, segment_size, report=None):
+    if from_block > to_block:
+        raise Exception(f"--from {from_block} is bigger than --to {to_block}")
+
+    from app import create_app
+    from .models import db
+    from .outbox import add_notifications
+
+    app = create_app()
+    app.app_context().push()
+
+    segments = [(start, min(start + segment_size - 1, to_block))
+                for start in range(from_block, to_block + 1, segment_size)]
+    logger.warning(f"Backfilling blocks {from_block} - {to_block} in {len(segments)} segments with {workers} workers")
+
+    seen = set()
+    total = 0
+    report_file = open(report, 'a') if report else None
+    started = time.time()
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker) as executor:
+            for start_block, end_block, found in executor.map(scan_segment, segments):
+                new = []
+                for symbol, txid, drain_address in found:
+                    if (symbol, txid) not in seen:
+                        seen.add((symbol, txid))
+                        new.append((symbol, txid))
+                if report_file:
+                    for symbol, txid in new:
+                        report_file.write(json.dumps({'symbol': symbol, 'txid': txid, 'segment': [start_block, end_block]}) + '\n')
+                    report_file.flush()
+                    added = len(new)
+                else:
+                    added = add_notifications(new, end_block)
+                    db.session.commit()
+                    db.session.close()
+                total = total + added
+                logger.warning(f"Backfilled blocks {start_block} - {end_block}, {added} new transactions, "
+                               f"{(end_block - from_block + 1) / (time.time() - started):.1f} blocks/sec")
+    finally:
+        if report_file:
+            report_file.close()
+    logger.warning(f"Backfill of blocks {from_block} - {to_block} is done, {total} new transactions")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rescan blocks for transactions of our accounts")
+    parser.add_argument('--from', dest='from_block', type=int, required=True)
+    parser.add_argument('--to', dest='to_block', type=int, required=True)
+    parser.add_argument('--workers', type=int, default=config['BACKFILL_WORKERS'])
+    parser.add_argument('--segment', type=int, default=config['BACKFILL_SEGMENT_SIZE'],
+                        help="number of blocks given to a worker at once")
+    parser.add_argument('--report', help="write found transactions to this file instead of the notification outbox")
+    args = parser.parse_args()
+    backfill(args.from_block, args.to_block, args.workers, args.segment, args.report)
+
+
+if __name__ == '__main__':
+    main()
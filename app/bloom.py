@@ -0,0 +1,55 @@
+from eth_utils import keccak
+from web3 import Web3
+
+from .config import config, get_contract_address
+from .token import TRANSFER_TOPIC
+
+
+def bloom_mask(value: bytes) -> int:
+    """
+    2048-bit logsBloom of a single address or topic as int.
+    Bits are taken from the first three 16-bit words of keccak(value), same as the node does.
+    """
+    h = keccak(value)
+    mask = 0
+    for i in (0, 2, 4):
+        mask |= 1 << (((h[i] << 8) | h[i + 1]) & 2047)
+    return mask
+
+
+class LogsBloomFilter:
+    """
+    Tells if a block may have a token Transfer from/to one of our accounts.
+
+    Masks of the accounts are computed once and kept between calls of update_accounts(),
+    only addresses added to the AddressIndex since the previous call are hashed. Accounts are grouped by the lowest bit of their mask,
+    so a block check looks only at accounts whose lowest bit is set in the block bloom.
+    """
+
+    def __init__(self):
+        self.transfer_mask = bloom_mask(Web3.to_bytes(hexstr=TRANSFER_TOPIC))
+        self.contract_masks = [bloom_mask(Web3.to_bytes(hexstr=get_contract_address(token)))
+                               for token in config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys()]
+        self.accounts_seen = 0
+        self.groups = {}
+
+    def update_accounts(self, accounts):
+        added = accounts.since(self.accounts_seen)
+        self.accounts_seen += len(added)
+        for address in added:
+            # account appears in logs as a 32 bytes topic
+            mask = bloom_mask(address.rjust(32, b'\0'))
+            self.groups.setdefault((mask & -mask).bit_length() - 1, set()).add(mask)
+
+    def match(self, logs_bloom) -> bool:
+        bloom = int.from_bytes(bytes(logs_bloom), 'big')
+        if bloom & self.transfer_mask != self.transfer_mask:
+            return False
+        if not any(bloom & mask == mask for mask in self.contract_masks):
+            return False
+        for bit, masks in self.groups.items():
+            if (bloom >> bit) & 1:
+                for mask in masks:
+                    if bloom & mask == mask:
+                        return True
+        return False
@@ -0,0 +1,128 @@
+from .config import config, get_disperse_address
+from .rpc import get_contract
+
+
+DISPERSE_ABI = [
+    {
+        "inputs": [{"name": "recipients", "type": "address[]"}, {"name": "values", "type": "uint256[]"}],
+        "name": "disperseEther",
+        "outputs": [],
+        "stateMutability": "payable",
+        "type": "function",
+    },
+    {
+        "inputs": [{"name": "token", "type": "address"}, {"name": "recipients", "type": "address[]"},
+                   {"name": "values", "type": "uint256[]"}],
+        "name": "disperseToken",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+]
+
+# gas model of one recipient inside a disperse call, from the gas of a plain transfer to it
+TX_BASE_GAS = 21000
+# disperseToken transferFrom of the total, loops and memory of the call
+DISPERSE_CALL_GAS = 60000
+# value transfer and cold account access of a CALL, and G_newaccount for an empty recipient
+CALL_VALUE_GAS = 9000 + 2600
+NEW_ACCOUNT_GAS = 25000
+# calldata and loop of one row
+ROW_GAS = 5000
+
+
+def get_disperse_contract():
+    return get_contract(get_disperse_address(), DISPERSE_ABI)
+
+
+def ether_row_gas(has_balance):
+    return CALL_VALUE_GAS + ROW_GAS + (0 if has_balance else NEW_ACCOUNT_GAS)
+
+
+def token_row_gas(transfer_gas):
+    return transfer_gas - TX_BASE_GAS + ROW_GAS
+
+
+def split_by_gas(rows, row_gas, multiplier):
+    """Chunks of rows (indexes) whose disperse call, with gas multiplied, stays within DISPERSE_MAX_GAS"""
+    max_gas = config['DISPERSE_MAX_GAS'] / multiplier
+    chunks = []
+    chunk = []
+    chunk_gas = TX_BASE_GAS + DISPERSE_CALL_GAS
+    for i in rows:
+        if chunk and chunk_gas + row_gas[i] > max_gas:
+            chunks.append(chunk)
+            chunk = []
+            chunk_gas = TX_BASE_GAS + DISPERSE_CALL_GAS
+        chunk.append(i)
+        chunk_gas = chunk_gas + row_gas[i]
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def disperse_ether_transactions(recipients, values, payout_gas, multiplier):
+    """
+    (groups, transactions) paying values (wei) to recipients: disperseEther calls, and plain
+    transfers for contract recipients (has_balance None), which may need more than the 2300 gas
+    disperseEther forwards. groups[i] are the rows paid by transactions[i]. Transactions have
+    to, value, data and gas, fees and nonce are added by the caller.
+    """
+    contract = get_disperse_contract()
+    groups = []
+    transactions = []
+    rows = []
+    row_gas = {}
+    for i, (gas, has_balance) in enumerate(payout_gas):
+        if has_balance is None:
+            groups.append([i])
+            transactions.append({'to': recipients[i], 'value': values[i], 'data': b'', 'gas': int(gas * multiplier)})
+        else:
+            rows.append(i)
+            row_gas[i] = ether_row_gas(has_balance)
+    for chunk in split_by_gas(rows, row_gas, multiplier):
+        groups.append(chunk)
+        transactions.append({
+            'to': contract.address,
+            'value': sum(values[i] for i in chunk),
+            'data': contract.encode_abi('disperseEther', args=[[recipients[i] for i in chunk], [values[i] for i in chunk]]),
+            'gas': int((TX_BASE_GAS + DISPERSE_CALL_GAS + sum(row_gas[i] for i in chunk)) * multiplier),
+        })
+    return groups, transactions
+
+
+def disperse_token_transactions(token, recipients, values, payout_gas, multiplier):
+    """
+    (groups, transactions) paying values (token units) to recipients with disperseToken calls.
+    The sender has to approve the disperse contract for the total before them, see disperse_token_approval().
+    """
+    contract = get_disperse_contract()
+    groups = []
+    transactions = []
+    row_gas = {i: token_row_gas(gas) for i, (gas, has_balance) in enumerate(payout_gas)}
+    for chunk in split_by_gas(range(len(recipients)), row_gas, multiplier):
+        groups.append(chunk)
+        transactions.append({
+            'to': contract.address,
+            'value': 0,
+            'data': contract.encode_abi('disperseToken', args=[token, [recipients[i] for i in chunk], [values[i] for i in chunk]]),
+            'gas': int((TX_BASE_GAS + DISPERSE_CALL_GAS + sum(row_gas[i] for i in chunk)) * multiplier),
+        })
+    return groups, transactions
+
+
+def disperse_token_approval(token_contract, owner, total, multiplier):
+    """
+    approve transaction of total (token units) for the disperse contract, None if the allowance
+    of owner already covers it. disperseToken takes the total from the sender with transferFrom.
+    """
+    disperse_address = get_disperse_contract().address
+    if token_contract.functions.allowance(owner, disperse_address).call() >= total:
+        return None
+    gas = token_contract.functions.approve(disperse_address, total).estimate_gas({'from': owner})
+    return {
+        'to': token_contract.address,
+        'value': 0,
+        'data': token_contract.encode_abi('approve', args=[disperse_address, total]),
+        'gas': int(gas * multiplier),
+    }
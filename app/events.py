@@ -1,149 +1,382 @@
-from collections import defaultdict
-import requests as rq
+from queue import Queue, Empty, Full
+import threading
 import time
-import ahocorasick
 
-from web3 import Web3, HTTPProvider
+from web3 import Web3
+from prometheus_client import Gauge
 
-from .models import Settings, db, Wallets, Accounts
-from .config import config, get_contract_abi, get_contract_address
+from .models import PendingDrains, Settings, db
+from .config import config
 from .logging import logger
-from .token import Token, get_all_accounts
+from .token import get_all_accounts, get_all_token_transfers
+from .bloom import LogsBloomFilter
+from .heads import NewHeadsListener
+from .outbox import add_notifications, resend_notifications_after
+from .address_index import get_address_index
+from .internal_txs import InternalTransfersDetector
+from .traces import trace_blocks
+from .raw_blocks import get_raw_blocks
+from .rpc import get_client, get_w3
+from .reorg import BlockHashRing, Rollback
 
 
 
-w3 = Web3(HTTPProvider(config["FULLNODE_URL"], 
-                       request_kwargs={'timeout': int(config['FULLNODE_TIMEOUT'])}))
+w3 = get_w3()
+
+scanner_batch_size = Gauge('block_scanner_batch_size', 'Number of blocks in the next scanner batch')
+scanner_lag = Gauge('block_scanner_lag_blocks', 'Number of confirmed blocks the scanner is behind')
+scanner_batch_latency = Gauge('block_scanner_batch_latency_seconds', 'Time spent on fetching the last scanner batch')
 
 def handle_event(transaction):        
     logger.info(f'new transaction: {transaction!r}')
 
 
-def walletnotify_shkeeper(symbol, txid) -> bool:
-    """Notify SHKeeper about transaction"""
-    logger.warning(f"Notifying about {symbol}/{txid}")
-    while True:
+def _put(q, item, stop):
+    """Put item to a bounded stage queue, giving up when the pipeline is stopped"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    """Get item from a stage queue, returns None when the pipeline is stopped"""
+    while not stop.is_set():
         try:
-            r = rq.post(
-                    f'http://{config["SHKEEPER_HOST"]}/api/v1/walletnotify/{symbol}/{txid}',
-                    headers={'X-Shkeeper-Backend-Key': config['SHKEEPER_KEY']}).json()
-            if r["status"] == "success":
-                logger.warning(f"The notification about {symbol}/{txid} was successful")
-                return True
+            return q.get(timeout=1)
+        except Empty:
+            continue
+    return None
+
+
+class BatchSizeController:
+    """
+    Picks the number of blocks for the next scanner batch.
+
+    The batch grows while we are behind the head and the fullnode answers fast,
+    and is halved when a request fails, takes longer than BLOCK_SCANNER_TARGET_LATENCY
+    or returns more than BLOCK_SCANNER_MAX_BATCH_TXS transactions.
+    """
+
+    def __init__(self):
+        self.min_size = config['BLOCK_SCANNER_MIN_BATCH_SIZE']
+        self.max_size = config['BLOCK_SCANNER_MAX_BATCH_SIZE']
+        self.size = min(max(config['BLOCK_SCANNER_BATCH_SIZE'], self.min_size), self.max_size)
+        scanner_batch_size.set(self.size)
+
+    def next_size(self, lag):
+        return min(self.size, lag)
+
+    def done(self, batch_size, latency, txs_count, lag):
+        scanner_batch_latency.set(latency)
+        scanner_lag.set(lag)
+        if (latency > config['BLOCK_SCANNER_TARGET_LATENCY'] or 
+            txs_count > config['BLOCK_SCANNER_MAX_BATCH_TXS']):
+            self.size = max(self.min_size, self.size // 2)
+        elif batch_size == self.size and lag > self.size:
+            self.size = min(self.max_size, self.size + max(1, self.size // 4))
+        scanner_batch_size.set(self.size)
+
+    def failed(self):
+        """Shrink batch after a failed request, returns False if it cannot be shrunk anymore"""
+        if self.size <= self.min_size:
+            return False
+        self.size = max(self.min_size, self.size // 2)
+        scanner_batch_size.set(self.size)
+        return True
+
+
+def fetch_batch(logs_bloom, list_accounts, start_batch_block, last_batch_block):
+    # RawBlocks instead of web3 blocks, formatting every transaction costs more than matching them
+    responses = get_raw_blocks(start_batch_block, last_batch_block)
+
+    if config['LOGS_BLOOM_FILTER'].lower() == 'true':
+        # ask for logs only in blocks which may have transfers related to our accounts
+        candidates = [block.number for block in responses if logs_bloom.match(block.logsBloom)]
+    else:
+        candidates = [start_batch_block, last_batch_block]
+    if candidates:
+        transfers = get_all_token_transfers(w3, min(candidates), max(candidates), list_accounts)
+    else:
+        transfers = {}
+
+    # a node which is behind or on another fork returns logs of other blocks without an error
+    block_hashes = {block.number: block.hash for block in responses}
+    for token_transfers in transfers.values():
+        for transfer in token_transfers:
+            if block_hashes.get(transfer['block_number']) != bytes(transfer['block_hash']):
+                raise Exception(f"Transfer log of {transfer['txid']} is from block {transfer['block_number']} "
+                                f"{bytes(transfer['block_hash']).hex()} which is not in the fetched chain")
+
+    traces = None
+    if (config['INTERNAL_TXS_DETECTION'].lower() == 'true' and 
+        config['INTERNAL_TXS_MODE'] == 'trace'):
+        traces = trace_blocks(w3, responses, list_accounts)
+    return responses, transfers, traces
+
+
+def fetch_blocks(app, last_checked_block, check_interval, out_queue, stop, heads=None):
+    """
+    Pipeline stage 1: wait for new blocks and download them in batches with token transfers.
+    With a newHeads listener the stage wakes up on every head, otherwise it polls the fullnode.
+    Every batch is read from one endpoint which has its blocks, and must continue the chain
+    of the previous ones. On a reorg the stage sends Rollback to the last common block
+    and scans the new chain from there.
+    """
+    app.app_context().push()
+    client = get_client()
+    confirmations = config['BLOCK_SCANNER_CONFIRMATIONS']
+    ring = BlockHashRing()
+    logs_bloom = LogsBloomFilter()
+    batch_size = BatchSizeController()
+    list_accounts = get_address_index()
+    try:
+        while not stop.is_set():
+            last_block = heads.block_number() if heads else None
+            if last_block is None:
+                last_block =  w3.eth.block_number
+            if last_checked_block == '' or last_checked_block is None:
+                last_checked_block = last_block
+            # partial batches are processed up to this block, so near the head we lag only by confirmations
+            last_confirmed_block = last_block - confirmations
+            scanner_lag.set(max(0, last_confirmed_block - last_checked_block))
+
+            if last_checked_block > last_block:
+                logger.exception(f'Last checked block {last_checked_block} is bigger than last block {last_block} in blockchain')
+            elif last_checked_block < last_confirmed_block:
+                if config['LOGS_BLOOM_FILTER'].lower() == 'true':
+                    logs_bloom.update_accounts(list_accounts)
+                while last_checked_block < last_confirmed_block and not stop.is_set():
+                    start_batch_block = last_checked_block + 1
+                    started = time.time()
+                    try:
+                        # head, blocks, logs and traces of a batch come from one endpoint, so they are of one chain
+                        with client.pinned(start_batch_block + confirmations) as endpoint_head:
+                            last_available_block = min(last_confirmed_block, endpoint_head - confirmations)
+                            if last_available_block < start_batch_block:
+                                logger.warning(f"Fullnodes do not have block {start_batch_block + confirmations} yet")
+                                break
+                            last_batch_block = last_checked_block + batch_size.next_size(last_available_block - last_checked_block)
+                            logger.warning(f"Checking blocks {start_batch_block} - {last_batch_block}") 
+                            responses, transfers, traces = fetch_batch(logs_bloom, list_accounts, start_batch_block, last_batch_block)
+                            scanned = bool(ring.blocks)
+                            consistent = ring.verify(responses)
+                            if not consistent and scanned:
+                                # compared with the chain of the endpoint which served the batch
+                                fork_block = ring.find_fork(w3)
+                    except Exception as e:
+                        if not batch_size.failed():
+                            raise
+                        logger.warning(f"Cannot get blocks from {start_batch_block}: {e}. "
+                                       f"Retrying with batch size {batch_size.size}")
+                        continue
+                    if not consistent:
+                        if not scanned:
+                            # nothing to compare with yet, the node reorganized the batch while we fetched it
+                            logger.warning(f"Blocks {start_batch_block} - {last_batch_block} are not one chain, "
+                                           f"rescanning from block {start_batch_block}")
+                            break
+                        if fork_block is None:
+                            raise Exception(f"Chain reorganization before block {start_batch_block} is deeper "
+                                            f"than {config['REORG_BUFFER_SIZE']} blocks")
+                        logger.warning(f"Chain reorganization detected at blocks {start_batch_block} - {last_batch_block}, "
+                                       f"rescanning from block {fork_block + 1}")
+                        if not _put(out_queue, Rollback(fork_block), stop):
+                            return
+                        last_checked_block = fork_block
+                        continue
+                    ring.append(responses)
+                    batch_size.done(last_batch_block - start_batch_block + 1, 
+                                    time.time() - started,
+                                    sum(len(block.transactions) for block in responses),
+                                    last_confirmed_block - last_batch_block)
+
+                    if not _put(out_queue, (start_batch_block, last_batch_block, last_block, responses, transfers, traces, list_accounts), stop):
+                        return
+                    last_checked_block = last_batch_block
+            if heads:
+                heads.wait(check_interval)
             else:
-                logger.warning(f"Failed to notify SHKeeper about {symbol}/{txid}, received response: {r}")
-                time.sleep(5)
+                time.sleep(check_interval)
+    except Exception as e:
+        _put(out_queue, e, stop)
+
+
+def match_batch(responses, transfers, list_accounts, drain, internal_txs=None, traces=None):
+    """
+    Find transactions related to our accounts in a fetched batch.
+
+    Addresses are checked against the AddressIndex as they come from the node,
+    checksum is calculated only for deposits which should be drained.
+    Internal ETH transfers are taken from block traces if they are given, otherwise
+    InternalTransfersDetector reports contract calls mentioning our accounts.
+    Returns [(symbol, txid, account to drain or None), ...] in the order they were found.
+    """
+    found = []
+    coin_symbol = config["COIN_SYMBOL"]
+
+    for block in responses:  
+        for transaction in block.transactions:
+            to_ours = transaction.to in list_accounts
+            from_ours = transaction.sender in list_accounts
+            if to_ours or from_ours:
+                handle_event(transaction)
+                drain_address = None
+                if drain and to_ours and not from_ours:
+                    drain_address = Web3.to_checksum_address(transaction.to)
+                found.append((coin_symbol, transaction.hash[2:], drain_address))
+        if traces is not None:
+            for txid, address, value in traces.get(block.number, []):
+                drain_address = Web3.to_checksum_address(address) if drain else None
+                found.append((coin_symbol, txid, drain_address))
+        elif internal_txs:
+            for txid, address in internal_txs.scan_block(block, list_accounts):
+                found.append((coin_symbol, txid, None))
+
+    for token, token_transfers in transfers.items():
+        for transaction in token_transfers:
+            to_ours = transaction['to'] in list_accounts
+            from_ours = transaction['from'] in list_accounts
+            if to_ours or from_ours:
+                handle_event(transaction)
+                drain_address = None
+                if drain and to_ours and not from_ours:
+                    drain_address = Web3.to_checksum_address(transaction['to'])
+                found.append((token, transaction['txid'], drain_address))
+
+    return found
+
+
+def match_blocks(in_queue, out_queue, stop):
+    """Pipeline stage 2: find transactions related to our accounts in fetched batches"""
+    internal_txs = None
+    if (config['INTERNAL_TXS_DETECTION'].lower() == 'true' and 
+        config['INTERNAL_TXS_MODE'] == 'input'):
+        internal_txs = InternalTransfersDetector()
+    try:
+        while not stop.is_set():
+            item = _get(in_queue, stop)
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                _put(out_queue, item, stop)
+                return
+            if isinstance(item, Rollback):
+                if not _put(out_queue, item, stop):
+                    return
+                continue
+            start_batch_block, last_batch_block, last_block, responses, transfers, traces, list_accounts = item
+            if internal_txs:
+                internal_txs.update_accounts(list_accounts)
+            # drain deposits only near the head, not when catching up
+            found = match_batch(responses, transfers, list_accounts, (last_block - last_batch_block) < 40, internal_txs, traces)
+            if not _put(out_queue, (start_batch_block, last_batch_block, found), stop):
+                return
+    except Exception as e:
+        _put(out_queue, e, stop)
+
+
+def drain_deposits(drain_account, last_batch_block):
+    """
+    Start draining of PendingDrains whose block reached DRAIN_BLOCK_TAG, and remove them.
+    A drain started right before a crash may be started again, drain_account skips accounts
+    below the transfer threshold.
+    """
+    pending = PendingDrains.query.order_by(PendingDrains.id).all()
+    if not pending:
+        db.session.close()
+        return
+    if config['DRAIN_BLOCK_TAG'] == 'latest':
+        drain_block = last_batch_block
+    else:
+        try:
+            drain_block = w3.eth.get_block(config['DRAIN_BLOCK_TAG']).number
         except Exception as e:
-            logger.warning(f'Shkeeper notification failed for {symbol}/{txid}: {e}')
-            time.sleep(10)
+            logger.warning(f"Cannot get {config['DRAIN_BLOCK_TAG']} block, drains are postponed: {e}")
+            db.session.close()
+            return
+    for row in pending:
+        if row.block_number <= drain_block:
+            drain_account.delay(row.symbol, row.address)
+            db.session.delete(row)
+    db.session.commit()
+    db.session.close()
+
 
+def log_loop(last_checked_block, check_interval, heads=None):
+    """
+    Staged block scanner: fetch -> match -> dispatch -> checkpoint.
 
-def log_loop(last_checked_block, check_interval):
+    Fetching and matching run in their own threads connected by bounded queues,
+    so the next batch is downloaded while the current one is matched and saved.
+    Notifications are written to the outbox with the checkpoint here, strictly in batch order.
+    On Rollback the checkpoint goes back to the last common block and notifications
+    from the reorganized blocks are sent again. Deposits are drained only when their
+    block reached DRAIN_BLOCK_TAG, so a reorg cannot drain money we did not get.
+    Until then they wait in PendingDrains, saved with the checkpoint, so they are drained
+    after a restart too.
+    """
     from .tasks import drain_account
     from app import create_app
     app = create_app()
     app.app_context().push()
 
-    token_addresses = []
-
-    for token in config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys():
-        token_addresses.append(config['TOKENS'][config["CURRENT_OP_NETWORK"]][token]['contract_address'])
-
-    while True:       
-        
-        last_block =  w3.eth.block_number
-        if last_checked_block == '' or last_checked_block is None:
-            last_checked_block = last_block
-
-        if last_checked_block > last_block:
-            logger.exception(f'Last checked block {last_checked_block} is bigger than last block {last_block} in blockchain')
-        elif last_checked_block == last_block - 2:
-            pass
-        else:      
-            list_accounts = set(get_all_accounts()) 
-            for block_chunk in range((last_block - last_checked_block) // config['BLOCK_SCANNER_BATCH_SIZE']):
-                start_batch_block = last_checked_block + 1
-                last_batch_block = last_checked_block + config['BLOCK_SCANNER_BATCH_SIZE']
-                logger.warning(f"Checking blocks {start_batch_block} - {last_batch_block}") 
-                batch = w3.batch_requests()
-                for qq in range(config['BLOCK_SCANNER_BATCH_SIZE']):
-                    batch.add(w3.eth.get_block(start_batch_block + qq, True))
-                responses = batch.execute()
-                assert len(responses) == config['BLOCK_SCANNER_BATCH_SIZE']
-
-#################### internal transaction detection part ####################
-                # account_fragments = {addr[2:].lower() for addr in list_accounts} # for internal transaction check
-    
-                # A = ahocorasick.Automaton()
-                # for idx, word in enumerate(account_fragments):
-                #     A.add_word(word, (idx, word))
-                # A.make_automaton()
-#################### internal transaction detection part ####################
-
-                for block in responses:  
-                    block_txs = []    
-                    block_internal_txs = []      
-                    for transaction in block.transactions:
-                        if transaction['to'] in list_accounts or transaction['from'] in list_accounts:
-                            handle_event(transaction)
-                            block_txs.append(transaction['to'].lower())
-                            block_txs.append(transaction['from'].lower())
-                            walletnotify_shkeeper(config["COIN_SYMBOL"], transaction['hash'].hex())
-                            if ((transaction['to'] in list_accounts and transaction['from']  not in list_accounts) and 
-                                ((w3.eth.block_number - last_batch_block) < 40)):
-                                drain_account.delay(config["COIN_SYMBOL"], transaction['to'])
-                
-                    
-                    
-
-                for token in config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys():
-                    token_instance  = Token(token)
-                    transfers = token_instance.get_all_transfers(start_batch_block, last_batch_block)
-                    for transaction in transfers:
-
-                        if (token_instance.provider.to_checksum_address(transaction['from']) in list_accounts or 
-                            token_instance.provider.to_checksum_address(transaction['to']) in list_accounts):
-                            handle_event(transaction)
-                            walletnotify_shkeeper(token, transaction['txid'])
-                            if ((token_instance.provider.to_checksum_address(transaction['from']) not in list_accounts and 
-                                token_instance.provider.to_checksum_address(transaction['to']) in list_accounts) and 
-                                ((w3.eth.block_number - last_batch_block) < 40)):
-                                drain_account.delay(token, token_instance.provider.to_checksum_address(transaction['to']))
-
-#################### internal transaction detection part ####################
-                    # start_t = time.time()
-
-                    # for transaction in block.transactions:
-                    #     if ((len(transaction.input) > 6) and # check only transactions with input (regular ARB transactions input is '0x')
-                    #         (transaction['to'] not in token_addresses)): # do not check internal transactions to known token addresses
-                    #         print(transaction)
-                    #         for end_index, (idx, found_address) in A.iter(transaction.input.hex()):
-                    #             logger.warning(f"Found internal transaction {transaction['hash'].hex()} to our address 0x{found_address}")
-                    #             if (str('0x'+found_address) not in block_txs): # check if a regular ARB tx was in this block to this address  
-                    #                 if (str('0x'+found_address) not in block_internal_txs):  # check if an internal tx to this address was in this block 
-                    #                     block_internal_txs.append(str('0x'+found_address)) 
-                    #                     walletnotify_shkeeper('ARB', transaction['hash'].hex())
-                    #                     break # need only 1 notify to get all internal txs to our addresses
-                    #                 else:
-                    #                     logger.warning(f"There was already an internal transaction to 0x{found_address} in {block.blockNumber} block, skip notification")
-                    #             else:
-                    #                 logger.warning(f"There was already a regular ARB transaction to 0x{found_address} in {block.blockNumber} block, skip notification")
-
-
-                    # finish_t = time.time()
-
-                    # logger.warning(f"internal transaction check time {finish_t - start_t}")
-
-#################### internal transaction detection part ####################
-
-                last_checked_block = last_batch_block
+    fetched = Queue(maxsize=config['BLOCK_SCANNER_QUEUE_SIZE'])
+    matched = Queue(maxsize=config['BLOCK_SCANNER_QUEUE_SIZE'])
+    stop = threading.Event()
+    stages = [
+        threading.Thread(daemon=True, name="Block fetcher", target=fetch_blocks,
+                         args=(app, last_checked_block, check_interval, fetched, stop, heads)),
+        threading.Thread(daemon=True, name="Block matcher", target=match_blocks,
+                         args=(fetched, matched, stop)),
+    ]
+    for stage in stages:
+        stage.start()
+
+    try:
+        while True:
+            item = matched.get()
+            if isinstance(item, Exception):
+                raise item
+            if isinstance(item, Rollback):
+                resent = resend_notifications_after(item.block_number)
                 pd = Settings.query.filter_by(name = "last_block").first()
-                pd.value = last_batch_block
-                with app.app_context():
+                if int(pd.value) > item.block_number:
+                    pd.value = item.block_number
                     db.session.add(pd)
-                    db.session.commit()
-                    db.session.close()
-        time.sleep(check_interval)
+                PendingDrains.query.filter(PendingDrains.block_number > item.block_number).delete(synchronize_session=False)
+                db.session.commit()
+                db.session.close()
+                logger.warning(f"Rolled back to block {item.block_number}, {resent} notifications will be sent again")
+                continue
+            start_batch_block, last_batch_block, found = item
+
+            # notifications and deposits to drain are saved in the same transaction as the checkpoint,
+            # notifications are delivered to SHKeeper by notifications_sender
+            added = add_notifications([(symbol, txid) for symbol, txid, drain_address in found], last_batch_block)
+            for symbol, txid, drain_address in found:
+                if drain_address:
+                    db.session.add(PendingDrains(symbol = symbol,
+                                                 address = drain_address,
+                                                 block_number = last_batch_block))
+            pd = Settings.query.filter_by(name = "last_block").first()
+            pd.value = last_batch_block
+            with app.app_context():
+                db.session.add(pd)
+                db.session.commit()
+                db.session.close()
+            if added:
+                logger.warning(f"Added {added} notifications from blocks {start_batch_block} - {last_batch_block} to outbox")
+
+            drain_deposits(drain_account, last_batch_block)
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join(timeout=int(config['FULLNODE_TIMEOUT']))
+
 
 def events_listener():
 
@@ -151,6 +384,10 @@ def events_listener():
     app = create_app()
     app.app_context().push()
 
+    heads = None
+    if config['FULLNODE_WS_URL']:
+        heads = NewHeadsListener(config['FULLNODE_WS_URL']).start()
+
     enough_accounts = False
     while not enough_accounts:
         list_accounts_ = set(get_all_accounts()) 
@@ -174,7 +411,7 @@ def events_listener():
         try:
             pd = Settings.query.filter_by(name = "last_block").first()
             last_checked_block = int(pd.value)
-            log_loop(last_checked_block, int(config["CHECK_NEW_BLOCK_EVERY_SECONDS"]))
+            log_loop(last_checked_block, int(config["CHECK_NEW_BLOCK_EVERY_SECONDS"]), heads)
         except Exception as e:
             sleep_sec = 60
             logger.exception(f"Exception in main block scanner loop: {e}")
@@ -0,0 +1,170 @@
+import json
+import os
+import statistics as st
+import threading
+import time
+from decimal import Decimal
+
+import redis
+from eth_utils import keccak
+from web3 import Web3
+
+from .config import config
+from .logging import logger
+from .rpc import GAS_PRICE_ORACLE_ADDRESS, get_w3
+
+
+# GasPriceOracle getters of the L1 data fee parameters and their FeeSnapshot fields,
+# the blob parameters exist since Ecotone and isFjord since Fjord
+L1_FEE_PARAMS = {
+    'l1BaseFee': 'l1_base_fee',
+    'blobBaseFee': 'blob_base_fee',
+    'baseFeeScalar': 'base_fee_scalar',
+    'blobBaseFeeScalar': 'blob_base_fee_scalar',
+    'decimals': 'l1_fee_decimals',
+    'isFjord': 'is_fjord',
+}
+
+
+class FeeSnapshot:
+    """Fee parameters of one block, all values are in wei or as returned by the contract"""
+
+    __slots__ = ('block_number', 'base_fee', 'gas_price', 'priority_fee_rewards', 'chain_id',
+                 'l1_base_fee', 'blob_base_fee', 'base_fee_scalar', 'blob_base_fee_scalar', 'l1_fee_decimals',
+                 'is_fjord', 'updated')
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def to_json(self):
+        return json.dumps({name: getattr(self, name) for name in self.__slots__})
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(**json.loads(data))
+
+
+def fetch_fees(provider):
+    """FeeSnapshot of the latest block with one JSON-RPC batch"""
+    requests = [
+        ('eth_getBlockByNumber', ['latest', False]),
+        ('eth_gasPrice', []),
+        ('eth_feeHistory', [hex(20), 'latest', [int(config['DYNAMIC_MAX_PRIORITY_FEE_PERCENTILE'])]]),
+        ('eth_chainId', []),
+    ] + [('eth_call', [{'to': GAS_PRICE_ORACLE_ADDRESS, 'data': '0x' + keccak(text=f'{name}()')[:4].hex()}, 'latest'])
+         for name in L1_FEE_PARAMS]
+    responses = provider.provider.make_batch_request(requests)
+    if not isinstance(responses, list):
+        raise Exception(f"Fee oracle batch failed: {responses.get('error')}")
+    for (method, params), response in zip(requests[:4], responses):
+        if 'error' in response:
+            raise Exception(f"Fee oracle {method} failed: {response['error']}")
+    block, gas_price, fee_history, chain_id = [response['result'] for response in responses[:4]]
+
+    l1_params = {}
+    for (name, field), response in zip(L1_FEE_PARAMS.items(), responses[4:]):
+        if 'error' in response:
+            # before Ecotone there are no blob parameters
+            logger.warning(f"Cannot get GasPriceOracle.{name}(): {response['error']}")
+            l1_params[field] = None
+        else:
+            l1_params[field] = int(response['result'], 16)
+
+    return FeeSnapshot(block_number=int(block['number'], 16),
+                       base_fee=int(block.get('baseFeePerGas') or '0x0', 16),
+                       gas_price=int(gas_price, 16),
+                       priority_fee_rewards=sorted(int(reward[0], 16) for reward in fee_history.get('reward') or []),
+                       chain_id=int(chain_id, 16),
+                       updated=time.time(),
+                       **l1_params)
+
+
+class FeeOracle:
+    """
+    Keeps the latest FeeSnapshot in memory, refreshed every FEE_ORACLE_REFRESH_SECONDS by a thread.
+
+    Processes share snapshots through Redis: the one which gets the refresh lock asks the
+    fullnode and stores the snapshot, the others read it from there. Without Redis every
+    process asks the fullnode itself. If the snapshot is older than FEE_ORACLE_MAX_AGE,
+    it is refreshed in the caller.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.redis = redis.Redis.from_url(f'redis://{config["REDIS_HOST"]}', socket_connect_timeout=1, socket_timeout=1)
+        self.redis_failed = False
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        snapshot = None
+        try:
+            key = config['FEE_ORACLE_KEY']
+            if self.redis.set(f'{key}:lock', os.getpid(), nx=True, px=int(config['FEE_ORACLE_REFRESH_SECONDS'] * 1000)):
+                snapshot = fetch_fees(get_w3())
+                self.redis.set(key, snapshot.to_json(), ex=int(config['FEE_ORACLE_MAX_AGE']))
+            else:
+                data = self.redis.get(key)
+                if data is not None:
+                    snapshot = FeeSnapshot.from_json(data)
+            self.redis_failed = False
+        except redis.RedisError as e:
+            if not self.redis_failed:
+                logger.warning(f"Fee oracle cannot use Redis, asking the fullnode in every process: {e}")
+            self.redis_failed = True
+        if snapshot is None:
+            snapshot = fetch_fees(get_w3())
+        with self.lock:
+            if self.snapshot is None or snapshot.updated >= self.snapshot.updated:
+                self.snapshot = snapshot
+        return snapshot
+
+    def run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Fee oracle refresh failed: {e}")
+            time.sleep(config['FEE_ORACLE_REFRESH_SECONDS'])
+
+    def get(self):
+        snapshot = self.snapshot
+        if snapshot is None or time.time() - snapshot.updated > config['FEE_ORACLE_MAX_AGE']:
+            snapshot = self.refresh()
+        return snapshot
+
+
+fee_oracle = None
+fee_oracle_pid = None
+fee_oracle_lock = threading.Lock()
+
+
+def get_fees():
+    """Latest FeeSnapshot of this process' FeeOracle, which is started on the first call"""
+    global fee_oracle, fee_oracle_pid
+    if fee_oracle_pid != os.getpid():
+        with fee_oracle_lock:
+            if fee_oracle_pid != os.getpid():
+                fee_oracle = FeeOracle()
+                threading.Thread(daemon=True, name="Fee oracle", target=fee_oracle.run).start()
+                fee_oracle_pid = os.getpid()
+    return fee_oracle.get()
+
+
+def get_max_priority_fee():
+    """maxPriorityFeePerGas in ETH, static from config or from the last 20 blocks' fee history"""
+    if config['MAX_PRIORITY_FEE_MODE'] == 'static':
+        return Decimal(config['MAX_PRIORITY_FEE'])
+    elif config['MAX_PRIORITY_FEE_MODE'] == 'dynamic':
+        sorted_fees = get_fees().priority_fee_rewards
+        mean = int(st.mean(sorted_fees[2:18]))
+        max_fee = Decimal(Web3.from_wei(mean, "ether"))
+        logger.warning(f"Calculated dynamic fee: {max_fee}")
+        if max_fee > Decimal(config['DYNAMIC_MAX_PRIORITY_FEE_LIMIT']):
+            logger.warning(f"Return max allowed fee from config {Decimal(config['DYNAMIC_MAX_PRIORITY_FEE_LIMIT'])}")
+            return Decimal(config['DYNAMIC_MAX_PRIORITY_FEE_LIMIT'])
+        else:
+            logger.warning(f'Return calculated fee {max_fee}')
+            return max_fee
+    else:
+        raise Exception("config['MAX_PRIORITY_FEE_MODE'] is incorrect, can be only 'static' or 'dynamic'")
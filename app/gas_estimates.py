@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import deque
+from decimal import Decimal
+
+from .config import config
+from .logging import logger
+from .multicall import get_balance_snapshot
+from .rpc import get_w3
+
+
+# recipient class of sample transfers for fee quotes, a 0 amount transfer to the sender
+# costs less than a real payout, so its gas is never used for one
+FEE_QUOTE = 'fee quote'
+
+
+class GasEstimates:
+    """
+    Gas of transfers by (asset, recipient has balance), the only thing ERC20 transfer gas
+    of a token depends on besides the sender. Estimates are taken from a sample transaction,
+    increased by GAS_ESTIMATE_MARGIN and kept for GAS_ESTIMATE_TTL seconds in this process.
+    There is no background refresh: an expired entry is estimated again on the next get().
+
+    Transactions sent with a cached estimate are tracked; when one of them runs out of gas
+    on-chain or cannot be sent, the estimates of its asset are dropped. Their receipts are
+    checked in get(), when GAS_ESTIMATE_RECEIPT_DELAY has passed.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.sent = deque(maxlen=1000)
+        self.lock = threading.Lock()
+
+    def get(self, asset, has_balance, estimate):
+        """Cached gas for the recipient class, estimate() is called on a miss"""
+        self.check_sent()
+        key = (asset, has_balance)
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry[1] > config['GAS_ESTIMATE_TTL']:
+            gas = int(Decimal(estimate()) * Decimal(config['GAS_ESTIMATE_MARGIN']))
+            entry = (gas, time.time())
+            with self.lock:
+                self.entries[key] = entry
+        return entry[0]
+
+    def invalidate(self, asset):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == asset]:
+                del self.entries[key]
+
+    def track(self, asset, txid, gas):
+        """Remember a transaction sent with a cached estimate to check its receipt later"""
+        with self.lock:
+            self.sent.append((asset, txid, gas, time.time()))
+
+    def check_sent(self):
+        """Receipts of tracked transactions older than GAS_ESTIMATE_RECEIPT_DELAY, in one batch"""
+        now = time.time()
+        with self.lock:
+            due = [item for item in self.sent if now - item[3] > config['GAS_ESTIMATE_RECEIPT_DELAY']]
+            if not due:
+                return
+            for item in due:
+                self.sent.remove(item)
+        try:
+            responses = get_w3().provider.make_batch_request(
+                [('eth_getTransactionReceipt', [txid]) for asset, txid, gas, sent_at in due])
+            if not isinstance(responses, list):
+                raise Exception(responses.get('error'))
+        except Exception as e:
+            logger.warning(f"Cannot check receipts of {len(due)} transactions sent with cached gas: {e}")
+            return
+
+        pending = []
+        for (asset, txid, gas, sent_at), response in zip(due, responses):
+            receipt = response.get('result')
+            if receipt is None:
+                # not mined yet, give up after 10 minutes
+                if now - sent_at < 600:
+                    pending.append((asset, txid, gas, sent_at))
+            elif int(receipt['status'], 16) == 0 and int(receipt['gasUsed'], 16) >= gas:
+                logger.warning(f"{asset} transaction {txid} ran out of {gas} gas, dropping cached gas estimates")
+                self.invalidate(asset)
+        with self.lock:
+            self.sent.extend(pending)
+
+
+gas_estimates = None
+gas_estimates_lock = threading.Lock()
+
+
+def get_gas_estimates():
+    global gas_estimates
+    with gas_estimates_lock:
+        if gas_estimates is None:
+            gas_estimates = GasEstimates()
+    return gas_estimates
+
+
+def get_recipient_classes(asset, addresses):
+    """
+    {address: has_balance} of transfer recipients from one balance snapshot. For the coin,
+    recipients with code get None: their gas depends on the contract and is not cached.
+    """
+    provider = get_w3()
+    addresses = list(dict.fromkeys(addresses))
+    snapshot = get_balance_snapshot(addresses, provider=provider)
+    column = snapshot.assets.index(asset)
+    classes = {account: bool(row[column]) for account, row in zip(snapshot.accounts, snapshot.balances)}
+    if asset == config["COIN_SYMBOL"]:
+        responses = provider.provider.make_batch_request(
+            [('eth_getCode', [address, hex(snapshot.block_number)]) for address in addresses])
+        if not isinstance(responses, list):
+            raise Exception(f"eth_getCode batch failed: {responses.get('error')}")
+        for address, response in zip(addresses, responses):
+            if 'error' in response:
+                raise Exception(f"eth_getCode of {address} failed: {response['error']}")
+            if response['result'] not in ('0x', '0x0'):
+                classes[address] = None
+    return classes
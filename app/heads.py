@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+
+from web3 import AsyncWeb3, WebSocketProvider
+
+from .config import config
+from .logging import logger
+
+
+class NewHeadsListener:
+    """
+    Keeps a newHeads subscription to the fullnode WebSocket endpoint in a background thread.
+
+    The block scanner waits on it instead of sleeping between head polls.
+    While the socket is down or heads stop coming, block_number() returns None
+    and the scanner falls back to polling the HTTP endpoint.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.connected = False
+        self.head = None
+        self.head_received_at = 0
+        self.new_head = threading.Event()
+        self.thread = threading.Thread(daemon=True, name="WS newHeads listener", target=self._run)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                asyncio.run(self._listen())
+                logger.warning("newHeads subscription is closed by the fullnode")
+            except Exception as e:
+                logger.warning(f"newHeads subscription failed: {e}")
+            finally:
+                # heads may be missed until the next subscription, do not trust the last one
+                self.connected = False
+                self.head = None
+            time.sleep(config['FULLNODE_WS_RECONNECT_SECONDS'])
+
+    async def _listen(self):
+        async with AsyncWeb3(WebSocketProvider(self.url)) as ws_w3:
+            await ws_w3.eth.subscribe('newHeads')
+            self.connected = True
+            logger.warning(f"Subscribed to newHeads on {self.url}")
+            async for message in ws_w3.socket.process_subscriptions():
+                self.head = int(message['result']['number'])
+                self.head_received_at = time.time()
+                self.new_head.set()
+
+    def block_number(self):
+        """Last head from the subscription, None if it cannot be trusted"""
+        if (self.connected and self.head is not None and
+            time.time() - self.head_received_at < config['FULLNODE_WS_HEAD_TIMEOUT']):
+            return self.head
+        return None
+
+    def wait(self, check_interval):
+        """Sleep until the next head arrives, or for check_interval when the subscription is down"""
+        if self.block_number() is None:
+            time.sleep(check_interval)
+            return
+        self.new_head.wait(config['FULLNODE_WS_HEAD_TIMEOUT'])
+        self.new_head.clear()
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import ahocorasick
+
+from .config import config, get_contract_address
+from .logging import logger
+
+
+class InternalTransfersDetector:
+    """
+    Finds our addresses in transaction input, to detect contract calls which may send ETH to our accounts.
+
+    The Aho-Corasick automaton is kept between calls and only addresses added to the
+    AddressIndex since the previous update_accounts() are inserted. New addresses go
+    to a small automaton which is cheap to rebuild, and are merged into the main one
+    when it grows to a tenth of the main one.
+    Addresses are searched in raw input bytes, mapped 1:1 to str with latin-1
+    because pyahocorasick is built with unicode keys.
+    """
+
+    def __init__(self):
+        self.automaton = ahocorasick.Automaton()
+        self.recent = ahocorasick.Automaton()
+        self.accounts_seen = 0
+        self.token_addresses = {bytes.fromhex(get_contract_address(token)[2:])
+                                for token in config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys()}
+        self.lock = threading.Lock()
+
+    def update_accounts(self, accounts):
+        with self.lock:
+            added = accounts.since(self.accounts_seen)
+            if not added:
+                return
+            self.accounts_seen += len(added)
+            for address in added:
+                self.recent.add_word(address.decode('latin-1'), address)
+            if len(self.recent) > max(1000, len(self.automaton) // 10):
+                for word, address in self.recent.items():
+                    self.automaton.add_word(word, address)
+                self.automaton.make_automaton()
+                self.recent = ahocorasick.Automaton()
+            else:
+                self.recent.make_automaton()
+            logger.debug(f"Added {len(added)} addresses to internal transaction detector")
+
+    def find(self, data):
+        """Our addresses (raw bytes) mentioned in data"""
+        found = []
+        if len(data) < 20:
+            return found
+        data = bytes(data).decode('latin-1')
+        with self.lock:
+            for automaton in (self.automaton, self.recent):
+                if automaton.kind != ahocorasick.AHOCORASICK:
+                    continue
+                for end_index, address in automaton.iter(data):
+                    if address not in found:
+                        found.append(address)
+        return found
+
+    def scan_block(self, block, list_accounts):
+        """
+        Find transactions which may send ETH to our accounts from a contract, in a RawBlock.
+
+        Transactions to token contracts are skipped. An address is reported once per
+        block and not at all if it had a regular transaction in the same block. Scanning stops when
+        INTERNAL_TXS_BLOCK_BUDGET seconds are spent on the block.
+        Returns [(txid, raw address), ...].
+        """
+        started = time.time()
+        block_txs = set()
+        for transaction in block.transactions:
+            if transaction.to in list_accounts or transaction.sender in list_accounts:
+                if transaction.to:
+                    block_txs.add(bytes.fromhex(transaction.to[2:]))
+                block_txs.add(bytes.fromhex(transaction.sender[2:]))
+
+        found = []
+        block_internal_txs = set()
+        for transaction in block.transactions:
+            if time.time() - started > config['INTERNAL_TXS_BLOCK_BUDGET']:
+                logger.warning(f"Internal transaction check of block {block.number} is out of time budget, "
+                               f"skipping the rest of the block")
+                break
+            # regular OP transfers have empty input
+            if len(transaction.input) <= 2 or not transaction.to:
+                continue
+            # do not check internal transactions to known token addresses
+            if bytes.fromhex(transaction.to[2:]) in self.token_addresses:
+                continue
+            for address in self.find(bytes.fromhex(transaction.input[2:])):
+                logger.warning(f"Found internal transaction {transaction.hash} to our address 0x{address.hex()}")
+                if address in block_txs:
+                    logger.warning(f"There was already a regular transaction to 0x{address.hex()} in {block.number} block, skip notification")
+                elif address in block_internal_txs:
+                    logger.warning(f"There was already an internal transaction to 0x{address.hex()} in {block.number} block, skip notification")
+                else:
+                    block_internal_txs.add(address)
+                    found.append((transaction.hash[2:], address))
+                    break # need only 1 notify to get all internal txs to our addresses
+        return found
+
+
+internal_txs_detector = None
+internal_txs_detector_lock = threading.Lock()
+
+
+def get_internal_txs_detector(accounts):
+    """Process-wide detector, updated with addresses added to accounts since the last call"""
+    global internal_txs_detector
+    with internal_txs_detector_lock:
+        if internal_txs_detector is None:
+            internal_txs_detector = InternalTransfersDetector()
+    internal_txs_detector.update_accounts(accounts)
+    return internal_txs_detector
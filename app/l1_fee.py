@@ -0,0 +1,130 @@
+import rlp
+from web3 import Web3
+
+from .fee_oracle import get_fees
+from .rpc import get_gas_price_oracle
+
+
+# GasPriceOracle constants
+DECIMALS = 6
+# signature bytes which getL1Fee adds to an unsigned transaction
+SIGNATURE_SIZE = 68
+FJORD_COST_INTERCEPT = -42_585_600
+FJORD_COST_FASTLZ_COEF = 836_500
+FJORD_MIN_TRANSACTION_SIZE = 100
+
+
+def flz_compress_len(data: bytes) -> int:
+    """Length of data compressed with FastLZ level 1, as LibZip.flzCompress of GasPriceOracle"""
+    n = 0
+    ht = [0] * 8192
+
+    def u24(i):
+        return data[i] | (data[i + 1] << 8) | (data[i + 2] << 16)
+
+    def hash_(v):
+        return ((2654435769 * v) & 0xffffffff) >> 19 & 0x1fff
+
+    def literals(r):
+        count = 0x21 * (r // 0x20)
+        r %= 0x20
+        if r:
+            count += r + 1
+        return count
+
+    def match(l):
+        l -= 1
+        return 3 * (l // 262) + (3 if l % 262 >= 6 else 2)
+
+    def cmp(p, q, e):
+        l = 0
+        e -= q
+        while l < e:
+            if data[p + l] != data[q + l]:
+                e = 0
+            l += 1
+        return l
+
+    a = 0
+    ip_limit = len(data) - 13 if len(data) >= 13 else 0
+    ip = 2
+    while ip < ip_limit:
+        while True:
+            s = u24(ip)
+            h = hash_(s)
+            r = ht[h]
+            ht[h] = ip
+            d = ip - r
+            if ip >= ip_limit:
+                break
+            ip += 1
+            if d <= 0x1fff and s == u24(r):
+                break
+        if ip >= ip_limit:
+            break
+        ip -= 1
+        if ip > a:
+            n += literals(ip - a)
+        l = cmp(r + 3, ip + 3, ip_limit + 9)
+        n += match(l)
+        ip += l
+        ht[hash_(u24(ip))] = ip
+        ip += 1
+        ht[hash_(u24(ip))] = ip
+        ip += 1
+        a = ip
+    return n + literals(len(data) - a)
+
+
+def _int(value):
+    if isinstance(value, str):
+        return int(value, 16)
+    return int(value)
+
+
+def serialize_transaction(tx) -> bytes:
+    """Unsigned EIP-1559 transaction payload of a transaction dict, as eth_account signs it"""
+    data = tx.get('data') or b''
+    if isinstance(data, str):
+        data = bytes.fromhex(data[2:] if data.startswith('0x') else data)
+    return b'\x02' + rlp.encode([
+        _int(tx['chainId']),
+        _int(tx['nonce']),
+        _int(tx['maxPriorityFeePerGas']),
+        _int(tx['maxFeePerGas']),
+        _int(tx['gas']),
+        bytes.fromhex(tx['to'][2:]),
+        _int(tx.get('value', 0)),
+        data,
+        [],
+    ])
+
+
+def get_l1_fee(payload: bytes, signed=False, fees=None) -> int:
+    """
+    L1 data fee in wei of a serialized transaction, computed from the fee oracle snapshot
+    with the Fjord or Ecotone formula of GasPriceOracle. For an unsigned payload the
+    signature is accounted for like getL1Fee does. Before Ecotone there are no scalar
+    parameters and GasPriceOracle.getL1Fee is called.
+    """
+    fees = fees or get_fees()
+    if fees.blob_base_fee is None or fees.blob_base_fee_scalar is None:
+        return get_gas_price_oracle().functions.getL1Fee(payload).call()
+    decimals = fees.l1_fee_decimals if fees.l1_fee_decimals is not None else DECIMALS
+
+    if fees.is_fjord:
+        size = flz_compress_len(payload) + (0 if signed else SIGNATURE_SIZE)
+        estimated_size = max(FJORD_MIN_TRANSACTION_SIZE * 10 ** 6,
+                             FJORD_COST_INTERCEPT + FJORD_COST_FASTLZ_COEF * size)
+        fee_scaled = fees.base_fee_scalar * 16 * fees.l1_base_fee + fees.blob_base_fee_scalar * fees.blob_base_fee
+        return estimated_size * fee_scaled // 10 ** (decimals * 2)
+
+    zeros = payload.count(0)
+    l1_gas = zeros * 4 + (len(payload) - zeros) * 16 + (0 if signed else SIGNATURE_SIZE * 16)
+    fee_scaled = fees.base_fee_scalar * 16 * fees.l1_base_fee + fees.blob_base_fee_scalar * fees.blob_base_fee
+    return l1_gas * fee_scaled // (16 * 10 ** decimals)
+
+
+def get_transaction_l1_fee(tx, fees=None):
+    """L1 data fee in ETH of a transaction dict before it is signed"""
+    return Web3.from_wei(get_l1_fee(serialize_transaction(tx), fees=fees), 'ether')
@@ -29,4 +29,28 @@ class Wallets(db.Model):
                                         onupdate=db.func.current_timestamp())
     status = db.Column(db.String(10))
     type = db.Column(db.String(30))
-    __table_args__ = (db.UniqueConstraint('id'), )
\ No newline at end of file
+    __table_args__ = (db.UniqueConstraint('id'), )
+
+class Notifications(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(20))
+    txid = db.Column(db.String(70))
+    block_number = db.Column(db.Integer)
+    status = db.Column(db.String(10), default="pending")
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt = db.Column(db.DateTime)
+    create_time = db.Column(db.DateTime, default=db.func.current_timestamp())
+    sent_time = db.Column(db.DateTime)
+    __table_args__ = (db.UniqueConstraint('id'), 
+                      db.UniqueConstraint('symbol', 'txid'), 
+                      db.Index('ix_notifications_pending', 'status', 'next_attempt'), )
+
+
+class PendingDrains(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(20))
+    address = db.Column(db.String(70))
+    block_number = db.Column(db.Integer)
+    create_time = db.Column(db.DateTime, default=db.func.current_timestamp())
+    __table_args__ = (db.UniqueConstraint('id'), 
+                      db.Index('ix_pending_drains_block_number', 'block_number'), )
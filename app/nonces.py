@@ -0,0 +1,165 @@
+import threading
+import time
+
+import redis
+from web3 import Web3
+
+from .config import config
+from .logging import logger
+from .rpc import get_w3
+
+
+# KEYS: next nonce, released nonces; ARGV: count.
+# Released nonces come first, then a new range. Returns false if the next nonce is unknown.
+RESERVE_SCRIPT = """
+if not redis.call('GET', KEYS[1]) then
+    return false
+end
+local count = tonumber(ARGV[1])
+local nonces = redis.call('ZRANGE', KEYS[2], 0, count - 1)
+if #nonces > 0 then
+    redis.call('ZREM', KEYS[2], unpack(nonces))
+end
+local rest = count - #nonces
+if rest > 0 then
+    local first = redis.call('INCRBY', KEYS[1], rest) - rest
+    for i = 0, rest - 1 do
+        table.insert(nonces, first + i)
+    end
+end
+return nonces
+"""
+
+# KEYS: next nonce, released nonces, gap; ARGV: pending transaction count, now, NONCE_GAP_SECONDS.
+# Returns the next nonce after the resync.
+RESYNC_SCRIPT = """
+local pending = tonumber(ARGV[1])
+local next = tonumber(redis.call('GET', KEYS[1]))
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', '(' .. pending)
+if not next or next <= pending then
+    redis.call('SET', KEYS[1], pending)
+    redis.call('DEL', KEYS[3])
+    return pending
+end
+if redis.call('ZSCORE', KEYS[2], pending) then
+    redis.call('DEL', KEYS[3])
+    return next
+end
+local gap = redis.call('HMGET', KEYS[3], 'nonce', 'since')
+if tonumber(gap[1]) ~= pending then
+    redis.call('HSET', KEYS[3], 'nonce', pending, 'since', ARGV[2])
+    return next
+end
+if tonumber(ARGV[2]) - tonumber(gap[2]) >= tonumber(ARGV[3]) then
+    redis.call('SET', KEYS[1], pending)
+    redis.call('DEL', KEYS[2], KEYS[3])
+    return pending
+end
+return next
+"""
+
+# errors of transactions the node rejects before they get into the mempool
+REJECTED_ERRORS = ('invalid sender', 'insufficient funds', 'intrinsic gas too low')
+
+
+class NonceManager:
+    """
+    Nonces of one sender shared by all processes through Redis.
+
+    The next nonce is taken from the node's pending transaction count once, then reserved
+    atomically without asking the node. Nonces of transactions which were not broadcast are
+    released and handed out again first, so they do not leave gaps. resync() moves the
+    next nonce up to the node's pending count, or down to it if the node has been stuck
+    at a nonce nobody will send for NONCE_GAP_SECONDS.
+
+    Without Redis every reservation asks the node for the pending count, as before.
+    """
+
+    def __init__(self, address):
+        self.address = Web3.to_checksum_address(address)
+        key = f"{config['NONCE_KEY']}:{config['CURRENT_OP_NETWORK']}:{address.lower()}"
+        self.keys = [key, f'{key}:released', f'{key}:gap']
+        self.redis = redis.Redis.from_url(f'redis://{config["REDIS_HOST"]}', socket_connect_timeout=1, socket_timeout=1)
+        self.reserve_script = self.redis.register_script(RESERVE_SCRIPT)
+        self.resync_script = self.redis.register_script(RESYNC_SCRIPT)
+        self.redis_failed = False
+
+    def pending_count(self):
+        return get_w3().eth.get_transaction_count(self.address, 'pending')
+
+    def use_redis(self, e=None):
+        if e is None:
+            self.redis_failed = False
+        else:
+            if not self.redis_failed:
+                logger.warning(f"Nonce manager cannot use Redis, asking the fullnode for nonces of {self.address}: {e}")
+            self.redis_failed = True
+
+    def reserve(self, count=1):
+        """count nonces in ascending order"""
+        try:
+            nonces = self.reserve_script(keys=self.keys[:2], args=[count])
+            if nonces is None:
+                self.resync()
+                nonces = self.reserve_script(keys=self.keys[:2], args=[count])
+            self.use_redis()
+            return [int(nonce) for nonce in nonces]
+        except redis.RedisError as e:
+            self.use_redis(e)
+            first = self.pending_count()
+            return list(range(first, first + count))
+
+    def release(self, nonces):
+        """Give back nonces whose transactions were not broadcast"""
+        if not nonces:
+            return
+        try:
+            self.redis.zadd(self.keys[1], {nonce: nonce for nonce in nonces})
+            self.use_redis()
+        except redis.RedisError as e:
+            self.use_redis(e)
+
+    def resync(self):
+        pending = self.pending_count()
+        try:
+            next_nonce = self.resync_script(keys=self.keys, args=[pending, int(time.time()), config['NONCE_GAP_SECONDS']])
+            self.use_redis()
+        except redis.RedisError as e:
+            self.use_redis(e)
+            return pending
+        return int(next_nonce)
+
+    def settle(self, nonces, errors):
+        """
+        Release the nonces of transactions which certainly did not get into the mempool,
+        errors are None for sent transactions. Only the rejections of REJECTED_ERRORS and
+        transactions not sent after an earlier failure are released. Other errors, like
+        "already known" or "replacement transaction underpriced" of a resend, may mean the
+        nonce is in the mempool already: they are kept as unknown broadcast results and
+        resync() takes care of them. A nonce too low was used elsewhere and leads to a resync.
+        """
+        released = []
+        used_elsewhere = False
+        for nonce, error in zip(nonces, errors):
+            if error is None:
+                continue
+            error = error.lower()
+            if error.startswith('not sent') or any(rejected in error for rejected in REJECTED_ERRORS):
+                released.append(nonce)
+            elif 'nonce too low' in error:
+                used_elsewhere = True
+        self.release(released)
+        if used_elsewhere:
+            self.resync()
+
+nonce_managers = {}
+nonce_managers_lock = threading.Lock()
+
+
+def get_nonce_manager(address):
+    with nonce_managers_lock:
+        manager = nonce_managers.get(address.lower())
+        if manager is None:
+            manager = NonceManager(address)
+            nonce_managers[address.lower()] = manager
+    return manager
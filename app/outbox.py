@@ -0,0 +1,113 @@
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests as rq
+from requests.adapters import HTTPAdapter
+
+from .models import Notifications, db
+from .config import config
+from .logging import logger
+
+
+def add_notifications(found, block_number):
+    """
+    Add notifications about found transactions to the current DB session.
+    They are saved together with the scanner checkpoint, when the session is committed.
+    Transactions which are already in the outbox are skipped.
+    """
+    keys = {(symbol, txid) for symbol, txid in found}
+    if not keys:
+        return 0
+    txids = {txid for symbol, txid in keys}
+    existing = Notifications.query.filter(Notifications.txid.in_(txids)).with_entities(
+        Notifications.symbol, Notifications.txid).all()
+    keys = keys - {(row.symbol, row.txid) for row in existing}
+    now = datetime.datetime.now()
+    for symbol, txid in keys:
+        db.session.add(Notifications(symbol = symbol,
+                                     txid = txid,
+                                     block_number = block_number,
+                                     status = "pending",
+                                     attempts = 0,
+                                     next_attempt = now,
+                                     ))
+    return len(keys)
+
+
+def resend_notifications_after(block_number):
+    """
+    Mark notifications from batches ending after block_number as pending again, in the current DB session.
+    After a reorg SHKeeper has to re-check these transactions, they may be gone or in another block.
+    """
+    return Notifications.query.filter(Notifications.block_number > block_number).update(
+        {Notifications.status: "pending",
+         Notifications.attempts: 0,
+         Notifications.next_attempt: datetime.datetime.now()},
+        synchronize_session=False)
+
+
+def walletnotify_shkeeper(symbol, txid, session=rq) -> bool:
+    """Notify SHKeeper about transaction, one attempt"""
+    try:
+        r = session.post(
+                f'http://{config["SHKEEPER_HOST"]}/api/v1/walletnotify/{symbol}/{txid}',
+                headers={'X-Shkeeper-Backend-Key': config['SHKEEPER_KEY']},
+                timeout=config['NOTIFY_TIMEOUT']).json()
+        if r["status"] == "success":
+            logger.warning(f"The notification about {symbol}/{txid} was successful")
+            return True
+        else:
+            logger.warning(f"Failed to notify SHKeeper about {symbol}/{txid}, received response: {r}")
+            return False
+    except Exception as e:
+        logger.warning(f'Shkeeper notification failed for {symbol}/{txid}: {e}')
+        return False
+
+
+def notifications_sender():
+    """
+    Deliver pending notifications from the outbox to SHKeeper.
+
+    Notifications are sent by NOTIFY_CONCURRENCY threads through one keep-alive session.
+    Failed ones are retried with exponential backoff up to NOTIFY_MAX_BACKOFF seconds.
+    A notification is marked as sent only after SHKeeper confirmed it, so after a restart
+    only unconfirmed ones are sent again.
+    """
+    from app import create_app
+    app = create_app()
+    app.app_context().push()
+
+    concurrency = config['NOTIFY_CONCURRENCY']
+    session = rq.Session()
+    session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="Notification sender")
+
+    while True:
+        try:
+            pending = Notifications.query.filter(Notifications.status == "pending",
+                                                 Notifications.next_attempt <= datetime.datetime.now(),
+                                                 ).order_by(Notifications.id).limit(concurrency * 10).all()
+            if not pending:
+                db.session.close()
+                time.sleep(1)
+                continue
+
+            results = executor.map(lambda n: walletnotify_shkeeper(n[0], n[1], session),
+                                   [(row.symbol, row.txid) for row in pending])
+            now = datetime.datetime.now()
+            for row, delivered in zip(pending, results):
+                if delivered:
+                    row.status = "sent"
+                    row.sent_time = now
+                else:
+                    row.attempts = row.attempts + 1
+                    backoff = min(config['NOTIFY_MAX_BACKOFF'], 2 ** row.attempts)
+                    row.next_attempt = now + datetime.timedelta(seconds=backoff)
+                db.session.add(row)
+            db.session.commit()
+            db.session.close()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"Exception in notifications sender: {e}")
+            time.sleep(10)
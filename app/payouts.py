@@ -0,0 +1,83 @@
+from eth_account import Account
+from eth_utils import keccak
+
+from .config import config
+from .logging import logger
+from .rpc import get_w3
+
+
+def sign_transactions(private_key, transactions):
+    """
+    Raw signed transactions in the order of transactions. They are signed in this process:
+    the worker runs threads, a process forked from it could inherit a held lock and hang.
+    """
+    return [bytes(Account.sign_transaction(transaction, private_key).raw_transaction) for transaction in transactions]
+
+
+def send_raw_transactions(raw_transactions, provider=None):
+    """
+    Broadcast signed transactions in eth_sendRawTransaction batches of PAYOUT_SEND_BATCH_SIZE,
+    returns (txid, error) for each of them, error is None if the node accepted it.
+
+    Transactions are signed with sequential nonces, so nothing after a failed one can be mined:
+    sending stops after the first batch with a failure and the rest is reported as not sent.
+    If a batch request itself fails, whether its transactions were accepted is unknown.
+    """
+    provider = provider or get_w3()
+    txids = ['0x' + keccak(raw).hex() for raw in raw_transactions]
+    results = []
+    size = config['PAYOUT_SEND_BATCH_SIZE']
+    for start in range(0, len(raw_transactions), size):
+        chunk = raw_transactions[start:start + size]
+        try:
+            responses = provider.provider.make_batch_request(
+                [('eth_sendRawTransaction', ['0x' + raw.hex()]) for raw in chunk])
+            if not isinstance(responses, list):
+                raise Exception(responses.get('error'))
+        except Exception as e:
+            logger.warning(f"eth_sendRawTransaction batch of {len(chunk)} failed: {e}")
+            results.extend((txid, f"Broadcast result of {txid} is unknown: {e}") for txid in txids[start:start + len(chunk)])
+            break
+        for txid, response in zip(txids[start:start + len(chunk)], responses):
+            if 'error' in response:
+                results.append((txid, str(response['error'].get('message', response['error']))))
+            else:
+                results.append((txid, None))
+        if any(error for txid, error in results[start:]):
+            break
+    for txid in txids[len(results):]:
+        results.append((txid, "Not sent, an earlier transaction failed"))
+    return results
+
+
+def make_payout_results(payout_list, sent, groups=None):
+    """
+    Payout results for SHKeeper from send_raw_transactions results.
+    groups[i] are the payout rows paid by transaction i, one row each by default.
+    """
+    if groups is None:
+        groups = [[i] for i in range(len(payout_list))]
+    row_sent = {}
+    for group, result in zip(groups, sent):
+        for i in group:
+            row_sent[i] = result
+    payout_results = []
+    for i, payout in enumerate(payout_list):
+        txid, error = row_sent[i]
+        if error is None:
+            payout_results.append({
+                "dest": payout['dest'],
+                "amount": float(payout['amount']),
+                "status": "success",
+                "txids": [txid[2:]],
+            })
+        else:
+            logger.warning(f"Payout of {payout['amount']} to {payout['dest']} failed: {error}")
+            payout_results.append({
+                "dest": payout['dest'],
+                "amount": float(payout['amount']),
+                "status": "error",
+                "msg": error,
+                "txids": [],
+            })
+    return payout_results
@@ -0,0 +1,80 @@
+import json
+
+from .rpc import get_client
+
+
+class RawTransaction:
+    """Fields of a transaction the scanner needs, as the node sent them: 0x-prefixed lowercase hex strings"""
+
+    __slots__ = ('hash', 'sender', 'to', 'input')
+
+    def __init__(self, hash, sender, to, input):
+        self.hash = hash
+        self.sender = sender
+        self.to = to
+        self.input = input
+
+    def __repr__(self):
+        return f"RawTransaction(hash={self.hash}, from={self.sender}, to={self.to})"
+
+
+class RawBlock:
+    """Block header fields used by the scanner with its transactions. Hashes and bloom are raw bytes."""
+
+    __slots__ = ('number', 'hash', 'parentHash', 'logsBloom', 'transactions')
+
+    def __init__(self, result):
+        self.number = int(result['number'], 16)
+        self.hash = bytes.fromhex(result['hash'][2:])
+        self.parentHash = bytes.fromhex(result['parentHash'][2:])
+        self.logsBloom = bytes.fromhex(result['logsBloom'][2:])
+        self.transactions = [RawTransaction(transaction['hash'],
+                                            transaction['from'],
+                                            transaction['to'],
+                                            transaction['input'])
+                             for transaction in result['transactions']]
+
+
+decoder = json.JSONDecoder()
+
+
+def iter_batch_response(text):
+    """
+    Decode elements of a JSON-RPC batch response one by one, so only
+    one of them is held as Python objects at a time.
+    """
+    position = text.index('[') + 1
+    while True:
+        while text[position] in ' \t\r\n,':
+            position += 1
+        if text[position] == ']':
+            return
+        element, position = decoder.raw_decode(text, position)
+        yield element
+
+
+def get_raw_blocks(start_block, last_block):
+    """
+    Blocks start_block..last_block with full transactions, in one eth_getBlockByNumber batch.
+
+    web3 result formatters and AttributeDicts are skipped, every block is turned
+    into a RawBlock as soon as it is decoded from the response.
+    """
+    batch = [{'jsonrpc': '2.0', 'method': 'eth_getBlockByNumber', 'params': [hex(number), True], 'id': number}
+             for number in range(start_block, last_block + 1)]
+    response = get_client().post(json.dumps(batch).encode())
+    response.raise_for_status()
+    text = response.text
+    if text.lstrip()[:1] != '[':
+        raise Exception(f"eth_getBlockByNumber batch failed: {text[:200]}")
+
+    blocks = [None] * len(batch)
+    for element in iter_batch_response(text):
+        if 'error' in element:
+            raise Exception(f"eth_getBlockByNumber failed for block {element.get('id')}: {element['error']}")
+        if element['result'] is None:
+            raise Exception(f"Block {element['id']} is not available yet")
+        blocks[element['id'] - start_block] = RawBlock(element['result'])
+    if None in blocks:
+        raise Exception(f"Not all blocks {start_block} - {last_block} were returned")
+    return blocks
@@ -0,0 +1,55 @@
+from collections import deque
+
+from web3.exceptions import BlockNotFound
+
+from .config import config
+from .logging import logger
+
+
+class Rollback:
+    """Pipeline message: blocks after block_number were reorganized and will be scanned again"""
+
+    def __init__(self, block_number):
+        self.block_number = block_number
+
+
+class BlockHashRing:
+    """
+    (number, hash, parentHash) of the last REORG_BUFFER_SIZE scanned blocks.
+
+    A new batch must continue the chain kept in the ring, otherwise there was a reorg
+    and find_fork() walks back until the node has the same block hash as we saw.
+    """
+
+    def __init__(self):
+        self.blocks = deque(maxlen=config['REORG_BUFFER_SIZE'])
+
+    def verify(self, blocks):
+        """True if blocks continue the chain in the ring and each other"""
+        parent = self.blocks[-1] if self.blocks else None
+        for block in blocks:
+            if parent and parent[0] == block.number - 1 and parent[1] != block.parentHash:
+                return False
+            parent = (block.number, block.hash, block.parentHash)
+        return True
+
+    def append(self, blocks):
+        for block in blocks:
+            self.blocks.append((block.number, block.hash, block.parentHash))
+
+    def find_fork(self, provider):
+        """
+        Last block we saw which is still in the chain of the provider, None if the reorg is deeper than the ring.
+        The provider should be pinned to the endpoint which served the new batch, another one may be on another fork.
+        """
+        while self.blocks:
+            number, block_hash, parent_hash = self.blocks[-1]
+            try:
+                if provider.eth.get_block(number).hash == block_hash:
+                    return number
+            except BlockNotFound:
+                # the endpoint switched to a shorter chain
+                pass
+            logger.warning(f"Block {number} {block_hash.hex()} is not in the canonical chain anymore")
+            self.blocks.pop()
+        return None
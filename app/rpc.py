@@ -0,0 +1,320 @@
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests as rq
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider, Web3
+from web3._utils.http_session_manager import HTTPSessionManager
+
+from .config import config, get_contract_abi, get_contract_address
+from .logging import logger
+from .rpc_cache import BlockPinnedCacheMiddleware
+
+
+GAS_PRICE_ORACLE_ADDRESS = Web3.to_checksum_address("0x420000000000000000000000000000000000000F")
+GAS_PRICE_ORACLE_ABI = [
+    {
+        "inputs": [{"internalType": "bytes", "name": "_data", "type": "bytes"}],
+        "name": "getL1Fee",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function",
+    }
+]
+
+# idempotent reads which may be sent to a second endpoint while the first one is slow
+HEDGED_METHODS = {'eth_getBlockByNumber', 'eth_getLogs', 'eth_call'}
+# transactions go only to the first endpoint in FULLNODE_URLS
+WRITE_METHODS = {'eth_sendRawTransaction', 'eth_sendTransaction'}
+
+rpc_lock = threading.Lock()
+rpc_session = None
+rpc_session_pid = None
+rpc_client = None
+rpc_client_pid = None
+rpc_w3 = None
+contracts = {}
+
+
+def get_urls():
+    """Fullnode endpoints, the first one is the primary"""
+    urls = [url.strip() for url in config['FULLNODE_URLS'].split(',') if url.strip()]
+    return urls or [config['FULLNODE_URL']]
+
+
+def get_session():
+    """
+    Process-wide keep-alive HTTP session to the fullnodes, shared by all threads.
+    A forked process (Celery worker, gunicorn worker) gets its own one.
+    """
+    global rpc_session, rpc_session_pid
+    if rpc_session_pid != os.getpid():
+        with rpc_lock:
+            if rpc_session_pid != os.getpid():
+                session = rq.Session()
+                adapter = HTTPAdapter(pool_connections=len(get_urls()), pool_maxsize=config['RPC_POOL_SIZE'])
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                rpc_session = session
+                rpc_session_pid = os.getpid()
+    return rpc_session
+
+
+def get_timeout():
+    return (config['RPC_CONNECT_TIMEOUT'], int(config['FULLNODE_TIMEOUT']))
+
+
+class Endpoint:
+    """Latency statistics and circuit breaker of one fullnode"""
+
+    def __init__(self, url):
+        self.url = url
+        self.latency = 0.0 # median of latencies, 0 until the first response so new endpoints are tried
+        self.latencies = deque(maxlen=100)
+        self.in_flight = 0
+        self.failures = 0
+        self.open_until = 0
+        self.lock = threading.Lock()
+
+    def available(self):
+        # after RPC_BREAKER_RESET_SECONDS requests go through again, one more failure opens the breaker
+        return self.open_until <= time.time()
+
+    def score(self):
+        return self.latency * (1 + self.in_flight)
+
+    def hedge_delay(self):
+        if len(self.latencies) < 20:
+            return config['RPC_HEDGE_DELAY']
+        return max(config['RPC_HEDGE_MIN_DELAY'], statistics.quantiles(self.latencies, n=20)[-1])
+
+    def succeeded(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            self.latency = statistics.median(self.latencies)
+            self.failures = 0
+            self.open_until = 0
+
+    def failed(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= config['RPC_BREAKER_FAILURES']:
+                if self.available():
+                    logger.warning(f"Fullnode {self.url} failed {self.failures} times in a row, "
+                                   f"not using it for {config['RPC_BREAKER_RESET_SECONDS']} sec")
+                self.open_until = time.time() + config['RPC_BREAKER_RESET_SECONDS']
+
+
+class RpcClient:
+    """
+    Sends JSON-RPC requests to FULLNODE_URLS.
+
+    Reads go to the available endpoint with the lowest median latency of its last 100
+    requests, weighted by requests in flight, and 5% of them to another one to keep its
+    latency up to date. If the endpoint does not answer within its p95 latency,
+    HEDGED_METHODS are sent to the next endpoint too and the first answer wins. A request
+    which lost the race is recorded with the latency it had when the race was over, so a
+    rare stall does not rank the endpoint down. Failed requests are retried on the other
+    endpoints. An endpoint which failed RPC_BREAKER_FAILURES times in a row is skipped for
+    RPC_BREAKER_RESET_SECONDS. Writes are sent only to the primary endpoint.
+
+    Reads which have to see the same chain (head, blocks and logs of a scanner batch)
+    are made inside pinned(), which sends all reads of the thread to one endpoint.
+    """
+
+    def __init__(self, urls):
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.primary = self.endpoints[0]
+        self.executor = ThreadPoolExecutor(max_workers=config['RPC_POOL_SIZE'], thread_name_prefix="RPC")
+        self.local = threading.local()
+
+    def ranked(self):
+        available = [endpoint for endpoint in self.endpoints if endpoint.available()]
+        if not available:
+            # all breakers are open, try the one which failed first
+            return sorted(self.endpoints, key=lambda endpoint: endpoint.open_until)
+        ranked = sorted(available, key=lambda endpoint: endpoint.score())
+        if len(ranked) > 1 and random.random() < 0.05:
+            # sometimes start with another endpoint, its latency may have improved since it was slow
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+        return ranked
+
+    def send(self, endpoint, data, headers, timeout, race_over=()):
+        with endpoint.lock:
+            endpoint.in_flight += 1
+        started = time.time()
+        try:
+            response = get_session().post(endpoint.url, data=data, headers=headers, timeout=timeout)
+            if response.status_code == 429 or response.status_code >= 500:
+                response.raise_for_status()
+        except Exception:
+            endpoint.failed()
+            raise
+        finally:
+            with endpoint.lock:
+                endpoint.in_flight -= 1
+        latency = time.time() - started
+        if race_over:
+            # another endpoint answered first, this one was at least as slow as the winner
+            latency = min(latency, race_over[0] - started)
+        endpoint.succeeded(latency)
+        return response
+
+    def post(self, data, headers=None, timeout=None):
+        """POST a JSON-RPC request or batch (bytes), returns requests.Response"""
+        headers = headers or {'Content-Type': 'application/json'}
+        timeout = timeout or get_timeout()
+        request = json.loads(data)
+        methods = {r['method'] for r in request} if isinstance(request, list) else {request['method']}
+
+        if methods & WRITE_METHODS or len(self.endpoints) == 1:
+            return self.send(self.primary, data, headers, timeout)
+        pinned_endpoint = getattr(self.local, 'endpoint', None)
+        if pinned_endpoint:
+            return self.send(pinned_endpoint, data, headers, timeout)
+        if methods <= HEDGED_METHODS:
+            return self.hedged(data, headers, timeout)
+
+        error = None
+        for endpoint in self.ranked():
+            try:
+                return self.send(endpoint, data, headers, timeout)
+            except Exception as e:
+                logger.warning(f"Request to fullnode {endpoint.url} failed: {e}")
+                error = e
+        raise error
+
+    def hedged(self, data, headers, timeout):
+        candidates = self.ranked()
+        pending = {}
+        # when each request in flight should be hedged, from the p95 latency of its endpoint
+        deadlines = {}
+        race_over = []
+        error = None
+
+        def submit():
+            endpoint = candidates.pop(0)
+            future = self.executor.submit(self.send, endpoint, data, headers, timeout, race_over)
+            pending[future] = endpoint
+            deadlines[future] = time.time() + endpoint.hedge_delay()
+
+        try:
+            while candidates or pending:
+                if candidates and (not pending or error):
+                    # nothing in flight, or the last one failed: go to the next endpoint at once
+                    submit()
+                    error = None
+                delay = max(0, min(deadlines.values()) - time.time()) if candidates and deadlines else None
+                done, _ = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+                if not done:
+                    # slow answer, hedge to the next endpoint and keep waiting for all of them
+                    del deadlines[min(deadlines, key=deadlines.get)]
+                    submit()
+                    continue
+                for future in done:
+                    failed_endpoint = pending.pop(future)
+                    deadlines.pop(future, None)
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        logger.warning(f"Request to fullnode {failed_endpoint.url} failed: {e}")
+                        error = e
+            raise error
+        finally:
+            race_over.append(time.time())
+            for future in pending:
+                future.cancel()
+
+    def block_number(self, endpoint):
+        data = json.dumps({'jsonrpc': '2.0', 'method': 'eth_blockNumber', 'params': [], 'id': 1}).encode()
+        response = self.send(endpoint, data, {'Content-Type': 'application/json'}, get_timeout()).json()
+        if 'error' in response:
+            raise Exception(f"eth_blockNumber failed: {response['error']}")
+        return int(response['result'], 16)
+
+    @contextmanager
+    def pinned(self, min_block=0):
+        """
+        Send all reads of this thread to one endpoint, without hedging and retries on other ones.
+        Endpoints are tried in the ranked order until one has min_block, the highest one is used
+        if none of them has it. Yields the head block number of the endpoint.
+        """
+        best = None
+        error = None
+        for endpoint in self.ranked():
+            try:
+                head = self.block_number(endpoint)
+            except Exception as e:
+                logger.warning(f"Request to fullnode {endpoint.url} failed: {e}")
+                error = e
+                continue
+            if best is None or head > best[1]:
+                best = (endpoint, head)
+            if head >= min_block:
+                break
+            logger.info(f"Fullnode {endpoint.url} is at block {head}, waiting for block {min_block}")
+        if best is None:
+            raise error
+        self.local.endpoint = best[0]
+        try:
+            yield best[1]
+        finally:
+            self.local.endpoint = None
+
+
+def get_client():
+    """Process-wide RpcClient for FULLNODE_URLS"""
+    global rpc_client, rpc_client_pid
+    if rpc_client_pid != os.getpid():
+        with rpc_lock:
+            if rpc_client_pid != os.getpid():
+                rpc_client = RpcClient(get_urls())
+                rpc_client_pid = os.getpid()
+    return rpc_client
+
+
+class SharedSessionManager(HTTPSessionManager):
+    """Sends web3 requests through the process-wide RpcClient instead of a session per thread"""
+
+    def make_post_request(self, endpoint_uri, data, **kwargs):
+        response = get_client().post(data, headers=kwargs.get('headers'), timeout=kwargs.get('timeout'))
+        response.raise_for_status()
+        return response.content
+
+
+def get_w3():
+    """Process-wide Web3 on the shared RpcClient"""
+    global rpc_w3
+    with rpc_lock:
+        if rpc_w3 is None:
+            provider = HTTPProvider(get_urls()[0], request_kwargs={'timeout': get_timeout()})
+            provider._request_session_manager = SharedSessionManager()
+            rpc_w3 = Web3(provider)
+            rpc_w3.middleware_onion.inject(BlockPinnedCacheMiddleware, name='block_pinned_cache', layer=0)
+    return rpc_w3
+
+
+def get_contract(address, abi):
+    """Contract object on the shared Web3, the ABI is parsed once per address"""
+    with rpc_lock:
+        contract = contracts.get(address)
+    if contract is None:
+        contract = get_w3().eth.contract(address=address, abi=abi)
+        with rpc_lock:
+            contracts[address] = contract
+    return contract
+
+
+def get_token_contract(symbol):
+    return get_contract(get_contract_address(symbol), get_contract_abi(symbol))
+
+
+def get_gas_price_oracle():
+    return get_contract(GAS_PRICE_ORACLE_ADDRESS, GAS_PRICE_ORACLE_ABI)
@@ -0,0 +1,158 @@
+import json
+import threading
+from collections import OrderedDict
+
+import redis
+from prometheus_client import Counter
+from web3.middleware import Web3Middleware
+
+from .config import config
+from .logging import logger
+
+
+# methods with a block number parameter, and its position
+BLOCK_PINNED_METHODS = {
+    'eth_getBlockByNumber': 0,
+    'eth_getBalance': 1,
+    'eth_call': 1,
+    'eth_getCode': 1,
+    'eth_getTransactionCount': 1,
+}
+# methods whose result is cached when the block it belongs to is deep enough
+HASH_METHODS = {'eth_getBlockByHash', 'eth_getTransactionByHash', 'eth_getTransactionReceipt'}
+
+rpc_cache_requests = Counter('rpc_cache_requests', 'Block-pinned RPC requests by cache result', ['result'])
+
+
+class LRUCache:
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+class BlockPinnedCache:
+    """
+    Results of RPC calls which cannot change anymore: state and blocks at a block number,
+    blocks and transactions by hash once their block is RPC_CACHE_MIN_DEPTH blocks
+    below the highest block number seen in eth_blockNumber answers, so reorgs do not reach them.
+    Kept in a process LRU and, with RPC_CACHE_REDIS, in Redis shared by all workers.
+    """
+
+    def __init__(self):
+        self.lru = LRUCache(config['RPC_CACHE_SIZE'])
+        self.redis = None
+        if config['RPC_CACHE_REDIS'].lower() == 'true':
+            self.redis = redis.Redis.from_url(f'redis://{config["REDIS_HOST"]}')
+        self.head = 0
+
+    def is_final(self, block_number):
+        return self.head and block_number <= self.head - config['RPC_CACHE_MIN_DEPTH']
+
+    def get(self, key):
+        value = self.lru.get(key)
+        if value is not None:
+            rpc_cache_requests.labels('memory').inc()
+            return value
+        if self.redis:
+            try:
+                data = self.redis.get(key)
+            except Exception as e:
+                logger.warning(f"RPC cache Redis get failed: {e}")
+                data = None
+            if data is not None:
+                rpc_cache_requests.labels('redis').inc()
+                value = json.loads(data)
+                self.lru.put(key, value)
+                return value
+        rpc_cache_requests.labels('miss').inc()
+        return None
+
+    def put(self, key, value):
+        self.lru.put(key, value)
+        if self.redis:
+            try:
+                self.redis.set(key, json.dumps(value), ex=config['RPC_CACHE_REDIS_TTL'])
+            except Exception as e:
+                logger.warning(f"RPC cache Redis set failed: {e}")
+
+    def cacheable_block(self, method, params, result):
+        """Block number the request or its result is pinned to, None if it is not pinned"""
+        if method in BLOCK_PINNED_METHODS:
+            position = BLOCK_PINNED_METHODS[method]
+            block = params[position] if len(params) > position else None
+            if isinstance(block, str) and block.startswith('0x'):
+                return int(block, 16)
+            if isinstance(block, int):
+                return block
+        elif method in HASH_METHODS and isinstance(result, dict):
+            block = result.get('blockNumber') or result.get('number')
+            if block:
+                return int(block, 16)
+        return None
+
+    def request(self, make_request, method, params):
+        if method == 'eth_blockNumber':
+            response = make_request(method, params)
+            if 'result' in response:
+                self.head = max(self.head, int(response['result'], 16))
+            return response
+        if method not in BLOCK_PINNED_METHODS and method not in HASH_METHODS:
+            return make_request(method, params)
+
+        if method in BLOCK_PINNED_METHODS:
+            # 'latest' and recent block numbers are not cached, they may be reorganized
+            block_number = self.cacheable_block(method, params, None)
+            if block_number is None or not self.is_final(block_number):
+                return make_request(method, params)
+
+        key = f"rpc-cache:{config['CURRENT_OP_NETWORK']}:{method}:{json.dumps(params, sort_keys=True)}"
+        result = self.get(key)
+        if result is not None:
+            return {'jsonrpc': '2.0', 'id': 0, 'result': result}
+
+        response = make_request(method, params)
+        result = response.get('result')
+        if result is not None and 'error' not in response:
+            block_number = self.cacheable_block(method, params, result)
+            if block_number is not None and self.is_final(block_number):
+                self.put(key, result)
+        return response
+
+
+block_pinned_cache = None
+block_pinned_cache_lock = threading.Lock()
+
+
+def get_block_pinned_cache():
+    global block_pinned_cache
+    with block_pinned_cache_lock:
+        if block_pinned_cache is None:
+            block_pinned_cache = BlockPinnedCache()
+    return block_pinned_cache
+
+
+class BlockPinnedCacheMiddleware(Web3Middleware):
+    """Serves block-pinned requests from BlockPinnedCache, add it as the innermost middleware"""
+
+    def wrap_make_request(self, make_request):
+        cache = get_block_pinned_cache()
+
+        def middleware(method, params):
+            return cache.request(make_request, method, params)
+
+        return middleware
@@ -1,10 +1,8 @@
 
 import decimal
 import time
-import copy
 import requests
 import eth_account 
-from web3 import Web3, HTTPProvider
 from decimal import Decimal
 
 from celery.schedules import crontab
@@ -18,22 +16,26 @@ from .encryption import Encryption
 from .token import Token, Coin, get_all_accounts
 from .unlock_acc import get_account_password
 from .utils import skip_if_running
+from .rpc import get_w3
+from .multicall import get_balance_snapshot
+from .token_meta import get_token_meta
+from .nonces import get_nonce_manager
 
 logger = get_task_logger(__name__)
 
-w3 = Web3(HTTPProvider(config["FULLNODE_URL"], 
-                       request_kwargs={'timeout': int(config['FULLNODE_TIMEOUT'])}))
+w3 = get_w3()
 
 @celery.task()
-def make_multipayout(symbol, payout_list, fee):
+def make_multipayout(symbol, payout_list, fee, mode=None):
+    disperse = (mode or config['PAYOUT_MODE']) == 'disperse'
     if symbol == config["COIN_SYMBOL"]:
         coint_inst = Coin(symbol)
-        payout_results = coint_inst.make_multipayout_eth(payout_list, fee)
+        payout_results = coint_inst.make_multipayout_eth(payout_list, fee, disperse)
         post_payout_results.delay(payout_results, symbol)
         return payout_results    
     elif symbol in config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys():
         token_inst = Token(symbol)
-        payout_results = token_inst.make_token_multipayout(payout_list, fee)
+        payout_results = token_inst.make_token_multipayout(payout_list, fee, disperse)
         post_payout_results.delay(payout_results, symbol)
         return payout_results    
     else:
@@ -57,6 +59,10 @@ def post_payout_results(data, symbol):
 
 @celery.task()
 def refresh_balances():
+    """
+    Update balances of all accounts in DB from Multicall3 snapshots, page by page,
+    and drain accounts which have enough coins or tokens.
+    """
     updated = 0
 
     try:
@@ -64,52 +70,52 @@ def refresh_balances():
         app = create_app()
         app.app_context().push()
 
-        list_acccounts = get_all_accounts()
-        for account in list_acccounts:
-            try:
-                pd = Accounts.query.filter_by(address = account).first()
-            except:
-                db.session.rollback()
-                raise Exception(f"There was exception during query to the database, try again later")
-
-            acc_balance = decimal.Decimal(w3.from_wei(w3.eth.get_balance(account), "ether"))
-            if Accounts.query.filter_by(address = account, crypto = config["COIN_SYMBOL"]).first():
-                pd = Accounts.query.filter_by(address = account, crypto = config["COIN_SYMBOL"]).first()            
-                pd.amount = decimal.Decimal(w3.from_wei(w3.eth.get_balance(account), "ether"))                     
-                with app.app_context():
-                    db.session.add(pd)
+        tokens = list(config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys())
+        # the same address may have rows for several cryptos
+        list_acccounts = list(dict.fromkeys(get_all_accounts()))
+        block_number = w3.eth.block_number
+        page_size = config['BALANCE_SNAPSHOT_PAGE']
+        for i in range(0, len(list_acccounts), page_size):
+            snapshot = get_balance_snapshot(list_acccounts[i:i + page_size], block_number)
+            balances = {}
+            for account, row in snapshot.rows():
+                if row[config["COIN_SYMBOL"]] is not None:
+                    row[config["COIN_SYMBOL"]] = decimal.Decimal(w3.from_wei(row[config["COIN_SYMBOL"]], "ether"))
+                for token in tokens:
+                    if row[token] is not None:
+                        row[token] = get_token_meta(token).from_units(row[token])
+                balances[account] = row
+
+            tries = 3
+            for j in range(tries):
+                try:
+                    rows = Accounts.query.filter(Accounts.address.in_(snapshot.accounts)).all()
+                    for pd in rows:
+                        amount = balances[pd.address].get(pd.crypto)
+                        if amount is not None:
+                            pd.amount = amount
                     db.session.commit()
                     db.session.close()
-            
-            have_tokens = False
-                
-            for token in config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys():
-                token_instance = Token(token)
-                if Accounts.query.filter_by(address = account, crypto = token).first():
-                    pd = Accounts.query.filter_by(address = account, crypto = token).first()
-                    balance = decimal.Decimal(token_instance.contract.functions.balanceOf(w3.to_checksum_address(account)).call())
-                    normalized_balance = balance / decimal.Decimal(10** (token_instance.contract.functions.decimals().call()))
-                    pd.amount = normalized_balance
-                    
-                    with app.app_context():
-                        db.session.add(pd)
-                        db.session.commit() 
-                        db.session.close()  
-                    if normalized_balance >= decimal.Decimal(get_min_token_transfer_threshold(token)):
-                        have_tokens = copy.deepcopy(token)
-                    
-            if have_tokens in config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys():
-                drain_account.delay(have_tokens, account) 
-            else:
-                if acc_balance >= decimal.Decimal(config['MIN_TRANSFER_THRESHOLD']):
-                    drain_account.delay(config["COIN_SYMBOL"], account)        
-    
-            updated = updated + 1                
-    
-            with app.app_context():
-                db.session.add(pd)
-                db.session.commit()
-                db.session.close()
+                except:
+                    db.session.rollback()
+                    if j < tries - 1: # j is zero indexed
+                        continue
+                    else:
+                        raise Exception(f"There was exception during query to the database, try again later")
+                break
+
+            for account, row in balances.items():
+                have_tokens = False
+                for token in tokens:
+                    if row[token] is not None and row[token] >= decimal.Decimal(get_min_token_transfer_threshold(token)):
+                        have_tokens = token
+                if have_tokens:
+                    drain_account.delay(have_tokens, account)
+                elif (row[config["COIN_SYMBOL"]] is not None and
+                      row[config["COIN_SYMBOL"]] >= decimal.Decimal(config['MIN_TRANSFER_THRESHOLD'])):
+                    drain_account.delay(config["COIN_SYMBOL"], account)
+            updated = updated + len(balances)
+            logger.warning(f"Refreshed balances of {updated} accounts at block {block_number}")
     finally:
         with app.app_context():
             db.session.remove()
@@ -146,10 +152,20 @@ def create_fee_deposit_account(self):
         
 
 
+@celery.task(bind=True)
+@skip_if_running
+def resync_nonces(self):
+    get_nonce_manager(Coin(config["COIN_SYMBOL"]).get_fee_deposit_account()).resync()
+    return True
+
+
 @celery.on_after_configure.connect
 def setup_periodic_tasks(sender, **kwargs):
 
     # Update cached account balances
     sender.add_periodic_task(int(config['UPDATE_TOKEN_BALANCES_EVERY_SECONDS']), refresh_balances.s())
 
+    # Catch up fee-deposit nonces with the node
+    sender.add_periodic_task(int(config['NONCE_RESYNC_SECONDS']), resync_nonces.s())
+
 
@@ -1,8 +1,8 @@
-from web3 import HTTPProvider, Web3
+from web3 import Web3
+from web3.exceptions import Web3RPCError
 from decimal import Decimal
 from flask import current_app as app
 import time
-import statistics as st
 
 
 from .logging import logger
@@ -10,6 +10,81 @@ from .encryption import Encryption
 from .config import config, get_contract_abi, get_contract_address, get_min_token_transfer_threshold
 from .models import Accounts, Settings, Wallets, db
 from .unlock_acc import get_account_password
+from .address_index import publish_new_address
+from .rpc import get_w3, get_token_contract
+from .token_meta import get_token_meta
+from .fee_oracle import get_fees, get_max_priority_fee
+from .l1_fee import get_transaction_l1_fee
+from .gas_estimates import FEE_QUOTE, get_gas_estimates, get_recipient_classes
+from .payouts import make_payout_results, send_raw_transactions, sign_transactions
+from .nonces import get_nonce_manager
+from .disperse import disperse_ether_transactions, disperse_token_approval, disperse_token_transactions
+
+
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
+def decode_transfer_log(log):
+    return {"txid": log.transactionHash.hex(),
+            "amount": Web3.to_int(log.data), 
+            "from": '0x'+log.topics[1].hex()[24:], 
+            "to": '0x'+log.topics[2].hex()[24:],
+            "block_number": log.blockNumber,
+            "block_hash": log.blockHash}
+
+
+def address_to_topic(address: bytes):
+    return '0x' + address.rjust(32, b'\0').hex()
+
+
+def get_all_token_transfers(provider, from_block, to_block, accounts=None):
+    """
+    Get Transfer events of all configured tokens with a single eth_getLogs
+    and split them by the emitting contract. Returns {symbol: [transfer, ...]}.
+
+    If accounts (AddressIndex) are given, they are pushed to the topic filters (one query with
+    them as sender and one as receiver, chunked by TOKEN_LOGS_TOPIC_FILTER_CHUNK_SIZE)
+    so the node returns only transfers related to our accounts. With more than
+    TOKEN_LOGS_TOPIC_FILTER_MAX_ADDRESSES accounts all transfers are requested.
+    """
+    tokens_by_address = {}
+    for token in config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys():
+        tokens_by_address[get_contract_address(token).lower()] = token
+
+    all_transfers = {token: [] for token in tokens_by_address.values()}
+    if not tokens_by_address:
+        return all_transfers
+    log_filter = {"fromBlock": from_block, 
+                  "toBlock": to_block, 
+                  "address": [Web3.to_checksum_address(address) for address in tokens_by_address],
+                  "topics": [TRANSFER_TOPIC]}
+
+    if (accounts is not None and 
+        config['TOKEN_LOGS_TOPIC_FILTER'].lower() == 'true' and
+        len(accounts) <= config['TOKEN_LOGS_TOPIC_FILTER_MAX_ADDRESSES']):
+        if not accounts:
+            return all_transfers
+        account_topics = [address_to_topic(address) for address in accounts]
+        chunk_size = config['TOKEN_LOGS_TOPIC_FILTER_CHUNK_SIZE']
+        batch = provider.batch_requests()
+        for i in range(0, len(account_topics), chunk_size):
+            chunk = account_topics[i:i + chunk_size]
+            batch.add(provider.eth.get_logs({**log_filter, "topics": [TRANSFER_TOPIC, chunk]}))
+            batch.add(provider.eth.get_logs({**log_filter, "topics": [TRANSFER_TOPIC, None, chunk]}))
+        logs = [log for response in batch.execute() for log in response]
+        # transfers between our own accounts are returned by both queries
+        logs = {(log.transactionHash, log.logIndex): log for log in logs}
+        logs = sorted(logs.values(), key=lambda log: (log.blockNumber, log.logIndex))
+    else:
+        logs = provider.eth.get_logs(log_filter)
+
+    for log in logs:
+        token = tokens_by_address.get(log.address.lower())
+        # Transfer with non-indexed from/to has another layout, skip it
+        if token is None or len(log.topics) != 3:
+            continue
+        all_transfers[token].append(decode_transfer_log(log))
+    return all_transfers
 
 
 def get_all_accounts():
@@ -31,50 +106,18 @@ def get_all_accounts():
     return account_list
 
 class Coin:
-    
-    w3 = Web3(HTTPProvider(config["FULLNODE_URL"], 
-                           request_kwargs={'timeout': int(config['FULLNODE_TIMEOUT'])}))
 
     def __init__(self, symbol, init=True):
         self.symbol = symbol        
         self.fullnode = config["FULLNODE_URL"]
-        self.provider =  Web3(HTTPProvider(config["FULLNODE_URL"], 
-                                           request_kwargs={'timeout': int(config['FULLNODE_TIMEOUT'])})) # Web3(HTTPProvider(config["FULLNODE_URL"]))
-        self.op_gas_price_oracle = Web3.to_checksum_address("0x420000000000000000000000000000000000000F")
-        self.op_price_oracle_abi = [
-            {
-                "inputs": [{"internalType": "bytes", "name": "_data", "type": "bytes"}],
-                "name": "getL1Fee",
-                "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-                "stateMutability": "view",
-                "type": "function",
-            }
-        ]
+        self.provider = get_w3()
 
 
     def get_max_priority_fee(self):
-        if config['MAX_PRIORITY_FEE_MODE'] == 'static':
-            return Decimal(config['MAX_PRIORITY_FEE'])
-        elif config['MAX_PRIORITY_FEE_MODE'] == 'dynamic':
-            fees = self.provider.eth.fee_history(20, 'latest', [int(config['DYNAMIC_MAX_PRIORITY_FEE_PERCENTILE'])])
-            sorted_fees = []
-            for rew in fees['reward']:
-                sorted_fees.append(rew[0])
-            sorted_fees.sort()
-            mean = int(st.mean(sorted_fees[2:18]))
-            max_fee = Decimal(self.provider.from_wei(mean, "ether"))
-            logger.warning(f"Calculated dynamic fee: {max_fee}")
-            if max_fee > Decimal(config['DYNAMIC_MAX_PRIORITY_FEE_LIMIT']):
-                logger.warning(f"Return max allowed fee from config {Decimal(config['DYNAMIC_MAX_PRIORITY_FEE_LIMIT'])}")
-                return Decimal(config['DYNAMIC_MAX_PRIORITY_FEE_LIMIT'])
-            else:     
-                logger.warning(f'Return calculated fee {max_fee}')
-                return max_fee
-        else:
-            raise Exception("config['MAX_PRIORITY_FEE_MODE'] is incorrect, can be only 'static' or 'dynamic'")
+        return get_max_priority_fee()
 
     def get_transaction_price(self):
-        gas_price = self.provider.eth.gas_price
+        gas_price = get_fees().gas_price
         fee = self.get_max_priority_fee()
         multiplier = Decimal(config['MULTIPLIER']) # make max fee per gas as *MULTIPLIER of base price + fee
         # add to need_crypto gas which need for sending crypto to tokken acc
@@ -84,9 +127,9 @@ class Coin:
                                 "value": self.provider.to_wei(0, "ether")}  # transaction example for counting gas
 
         payout_multiplier = Decimal(config['PAYOUT_MULTIPLIER'])
-        eth_gas_count = self.provider.eth.estimate_gas(eth_transaction)
+        eth_gas_count = get_gas_estimates().get(self.symbol, True, lambda: self.provider.eth.estimate_gas(eth_transaction))
         eth_gas_count =  int(eth_gas_count *  payout_multiplier)
-        gas_price = self.provider.eth.gas_price
+        gas_price = get_fees().gas_price
         max_fee_per_gas = ( Decimal(self.provider.from_wei(gas_price, "ether")) + Decimal(fee) ) * multiplier
         price = eth_gas_count  * max_fee_per_gas
         return price
@@ -116,6 +159,7 @@ class Coin:
                 db.session.remove()
                 db.engine.dispose() 
     
+        publish_new_address(acc.address)
         logger.info(f'Created fee-deposit account and added to DB')
 
     def get_fee_deposit_account(self):
@@ -152,7 +196,27 @@ class Coin:
                     balances.update({account.address: Decimal(account.amount)})
             return balances
         
-    def make_multipayout_eth(self, payout_list, fee,):
+    def estimate_payout_gas(self, payout_list):
+        """
+        (gas, has_balance) of each payout transfer, the gas is cached by recipient class.
+        has_balance is None for recipients with code, their gas is estimated each time.
+        """
+        sender = self.provider.to_checksum_address(self.get_fee_deposit_account())
+        classes = get_recipient_classes(self.symbol, [payout['dest'] for payout in payout_list])
+        gas_estimates = get_gas_estimates()
+        payout_gas = []
+        for payout in payout_list:
+            transaction = {"from": sender,
+                           "to": payout['dest'],
+                           "value": self.provider.to_wei(payout['amount'], "ether")}  # transaction example for counting gas
+            has_balance = classes[payout['dest']]
+            if has_balance is None:
+                payout_gas.append((self.provider.eth.estimate_gas(transaction), None))
+            else:
+                payout_gas.append((gas_estimates.get(self.symbol, has_balance, lambda: self.provider.eth.estimate_gas(transaction)), has_balance))
+        return payout_gas
+
+    def make_multipayout_eth(self, payout_list, fee, disperse=False):
         payout_results = []
         payout_list = payout_list
         fee = Decimal(fee)
@@ -168,74 +232,75 @@ class Coin:
                 logger.warning(f"Changed to {payout['dest']} which is checksum address")
          
         multiplier = Decimal(config['MULTIPLIER']) # make max fee per gas as *MULTIPLIER of base price + fee
-        max_payout_amount = Decimal(0)
-        for payout in payout_list:
-            if payout['amount'] > max_payout_amount:
-                max_payout_amount = payout['amount']
-        transaction = {"from": self.provider.to_checksum_address(self.get_fee_deposit_account()),
-                                "to": self.provider.to_checksum_address(payout_list[0]['dest']), 
-                                "value": self.provider.to_wei(max_payout_amount, "ether")}  # transaction example for counting gas
         payout_multiplier = Decimal(config['PAYOUT_MULTIPLIER'])
-        gas_count = self.provider.eth.estimate_gas(transaction)
-        gas_count = int(gas_count * payout_multiplier)
-        gas_price = self.provider.eth.gas_price
+        payout_gas = self.estimate_payout_gas(payout_list)
+        gas_price = get_fees().gas_price
         max_fee_per_gas = ( Decimal(self.provider.from_wei(gas_price, "ether")) + Decimal(fee) ) * multiplier
+        # all payout transactions, signed and sent when the funds are checked
+        recipients = [payout['dest'] for payout in payout_list]
+        values = [self.provider.to_wei(payout['amount'], "ether") for payout in payout_list]
+        if disperse:
+            groups, transactions = disperse_ether_transactions(recipients, values, payout_gas, payout_multiplier)
+        else:
+            groups = [[i] for i in range(len(payout_list))]
+            transactions = [{'to': recipient, 'value': value, 'data': b'', 'gas': int(gas_count * payout_multiplier)}
+                            for recipient, value, (gas_count, has_balance) in zip(recipients, values, payout_gas)]
         # Check if enouth funds for multipayout on account
         should_pay  = Decimal(0)
         for payout in payout_list:
             should_pay = should_pay + Decimal(payout['amount'])
+        for tx in transactions:
+            should_pay = should_pay + max_fee_per_gas * tx['gas']
+        payout_account = self.get_fee_deposit_account()
+        nonce_manager = get_nonce_manager(payout_account)
+        nonces = nonce_manager.reserve(len(transactions))
+        fees = get_fees()
+        for tx, nonce in zip(transactions, nonces):
+            tx.update({
+                'nonce': nonce,
+                'maxFeePerGas': self.provider.to_wei(max_fee_per_gas, 'ether'),
+                'maxPriorityFeePerGas': self.provider.to_wei(fee, "ether"),
+                'chainId': fees.chain_id,
+            })
         # ------------------------------------------------------------------
         # OPTIMISM L1 DATA FEE
         # ------------------------------------------------------------------
-        oracle = self.provider.eth.contract(
-            address=self.op_gas_price_oracle,
-            abi=self.op_price_oracle_abi
-        )
-        # dummy calldata 
-        tx_data = b""
-        l1_fee_wei = oracle.functions.getL1Fee(tx_data).call()
-        l1_fee_eth = Decimal(self.provider.from_wei(l1_fee_wei, "ether"))
+        # computed locally from the transactions which will be sent
+        l1_fee_eth = Decimal(0)
+        try:
+            for tx in transactions:
+                l1_fee_eth = l1_fee_eth + get_transaction_l1_fee(tx, fees)
+        except Exception:
+            nonce_manager.release(nonces)
+            raise
         # ------------------------------------------------------------------
         # OPTIMISM L1 DATA FEE
         # ------------------------------------------------------------------
-        should_pay = should_pay + len(payout_list) * ((max_fee_per_gas * gas_count) + l1_fee_eth)
+        should_pay = should_pay + l1_fee_eth
         have_crypto = self.get_fee_deposit_coin_balance()
         if have_crypto < should_pay:
+            nonce_manager.release(nonces)
             raise Exception(f"Have not enough crypto on fee account, need {should_pay} have {have_crypto}")
         else:
-            nonce = self.provider.eth.get_transaction_count(self.get_fee_deposit_account())
-            for payout in payout_list:
-                test_transaction = {"from": self.provider.to_checksum_address(self.get_fee_deposit_account()),
-                                    "to": self.provider.to_checksum_address(payout['dest']),
-                                    "value":  self.provider.to_wei(payout['amount'], "ether")}  # transaction example for counting gas
-
-                gas_count = self.provider.eth.estimate_gas(test_transaction)
-                gas_count = int(gas_count * payout_multiplier)       
-
-                tx = {
-                    'from': self.provider.to_checksum_address(self.get_fee_deposit_account()), 
-                    'to': self.provider.to_checksum_address(payout['dest']),
-                    'value': self.provider.to_hex(self.provider.to_wei(payout['amount'], "ether")),
-                    'nonce': nonce,
-                    'gas':  self.provider.to_hex(gas_count),
-                    'maxFeePerGas': self.provider.to_hex(self.provider.to_wei(max_fee_per_gas, 'ether')),
-                    'maxPriorityFeePerGas': self.provider.to_hex( self.provider.to_wei(fee, "ether")),
-                    'chainId': self.provider.eth.chain_id
-                }
-                signed_tx = self.provider.eth.account.sign_transaction(tx, self.get_seed_from_address(self.get_fee_deposit_account()))
-                txid = self.provider.eth.send_raw_transaction(signed_tx.raw_transaction)
-        
-            
-                payout_results.append({
-                    "dest": payout['dest'],
-                    "amount": float(payout['amount']),
-                    "status": "success",
-                    "txids": [txid.hex()],
-                })
-
-                nonce = nonce + 1
+            try:
+                raw_transactions = sign_transactions(self.get_seed_from_address(payout_account), transactions)
+            except Exception:
+                nonce_manager.release(nonces)
+                raise
+            sent = send_raw_transactions(raw_transactions)
+            nonce_manager.settle(nonces, [error for txid, error in sent])
+
+            gas_estimates = get_gas_estimates()
+            for (txid, error), tx, group in zip(sent, transactions, groups):
+                # gas of transactions to contract recipients is not from the cache
+                if len(group) == 1 and payout_gas[group[0]][1] is None:
+                    continue
+                if error is None:
+                    gas_estimates.track(self.symbol, txid, tx['gas'])
+                else:
+                    gas_estimates.invalidate(self.symbol)
+            payout_results = make_payout_results(payout_list, sent, groups)
 
-        
             return payout_results
    
     def drain_account(self, account, destination):
@@ -263,8 +328,8 @@ class Coin:
                                 "to":  self.provider.to_checksum_address(destination), 
                                 "value":  self.provider.to_wei(0, "ether")}  # transaction example for counting gas
         gas_count =  self.provider.eth.estimate_gas(transaction)
-        logger.warning(f"-------{self.provider.eth.gas_price}")
-        max_fee_per_gas = (self.provider.from_wei(self.provider.eth.gas_price, "ether") + Decimal(fee)) * multiplier
+        logger.warning(f"-------{get_fees().gas_price}")
+        max_fee_per_gas = (self.provider.from_wei(get_fees().gas_price, "ether") + Decimal(fee)) * multiplier
         try:
             account_balance =  self.provider.from_wei( self.provider.eth.get_balance(account), "ether")
         except Exception as e:
@@ -278,14 +343,18 @@ class Coin:
         # ------------------------------------------------------------------
         # OPTIMISM L1 DATA FEE
         # ------------------------------------------------------------------
-        oracle = self.provider.eth.contract(
-            address=self.op_gas_price_oracle,
-            abi=self.op_price_oracle_abi
-        )
-        # dummy calldata (ETH transfer has empty data, but Bedrock still charges)
-        tx_data = b""
-        l1_fee_wei = oracle.functions.getL1Fee(tx_data).call()
-        l1_fee_eth = Decimal(self.provider.from_wei(l1_fee_wei, "ether"))
+        # ETH transfer has empty data, but Bedrock still charges for the transaction itself.
+        # The value is not known yet, the whole balance is the longest one it can be.
+        nonce = self.provider.eth.get_transaction_count(account)
+        l1_fee_eth = Decimal(get_transaction_l1_fee({
+            'to': destination,
+            'value': self.provider.to_wei(account_balance, "ether"),
+            'nonce': nonce,
+            'gas': gas_count,
+            'maxFeePerGas': self.provider.to_wei(max_fee_per_gas, 'ether'),
+            'maxPriorityFeePerGas': self.provider.to_wei(fee, "ether"),
+            'chainId': get_fees().chain_id,
+        }))
         # ------------------------------------------------------------------
         # OPTIMISM L1 DATA FEE
         # ------------------------------------------------------------------
@@ -302,11 +371,11 @@ class Coin:
                     'from': self.provider.to_checksum_address(account), 
                     'to': self.provider.to_checksum_address(destination),
                     'value': self.provider.to_hex(self.provider.to_wei(can_send, "ether")),
-                    'nonce': self.provider.eth.get_transaction_count(account),
+                    'nonce': nonce,
                     'gas':  self.provider.to_hex(gas_count),
                     'maxFeePerGas': self.provider.to_hex(self.provider.to_wei(max_fee_per_gas, 'ether')),
                     'maxPriorityFeePerGas': self.provider.to_hex( self.provider.to_wei(fee, "ether")),
-                    'chainId': self.provider.eth.chain_id
+                    'chainId': get_fees().chain_id
                 }
             signed_tx = self.provider.eth.account.sign_transaction(tx, self.get_seed_from_address(account))
             txid = self.provider.eth.send_raw_transaction(signed_tx.raw_transaction)
@@ -369,25 +438,15 @@ class Coin:
 
 
 class Token:
-    w3 = Web3(HTTPProvider(config["FULLNODE_URL"], request_kwargs={'timeout': int(config['FULLNODE_TIMEOUT'])}))
 
     def __init__(self, symbol, init=True):
         self.symbol = symbol        
         self.contract_address = get_contract_address(symbol)
         self.abi = get_contract_abi(symbol)
         self.fullnode = config["FULLNODE_URL"]
-        self.provider = Web3(HTTPProvider(config["FULLNODE_URL"]))
-        self.contract = self.provider.eth.contract(address=self.contract_address, abi=self.abi)
-        self.op_gas_price_oracle = Web3.to_checksum_address("0x420000000000000000000000000000000000000F")
-        self.op_price_oracle_abi = [
-            {
-                "inputs": [{"internalType": "bytes", "name": "_data", "type": "bytes"}],
-                "name": "getL1Fee",
-                "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
-                "stateMutability": "view",
-                "type": "function",
-            }
-        ]
+        self.provider = get_w3()
+        self.contract = get_token_contract(symbol)
+        self.meta = get_token_meta(symbol)
 
 
     def get_seed_from_address(self, address):
@@ -406,38 +465,16 @@ class Token:
         return Encryption.decrypt(pd.priv_key)
     
     def get_max_priority_fee(self):
-        if config['MAX_PRIORITY_FEE_MODE'] == 'static':
-            return Decimal(config['MAX_PRIORITY_FEE'])
-        elif config['MAX_PRIORITY_FEE_MODE'] == 'dynamic':
-            fees = self.provider.eth.fee_history(20, 'latest', [int(config['DYNAMIC_MAX_PRIORITY_FEE_PERCENTILE'])])
-            sorted_fees = []
-            for rew in fees['reward']:
-                sorted_fees.append(rew[0])
-            sorted_fees.sort()
-            mean = int(st.mean(sorted_fees[2:18]))
-            max_fee = Decimal(self.provider.from_wei(mean, "ether"))
-            logger.warning(f"Calculated dynamic fee: {max_fee}")
-            if max_fee > Decimal(config['DYNAMIC_MAX_PRIORITY_FEE_LIMIT']):
-                logger.warning(f"Return max allowed fee from config {Decimal(config['DYNAMIC_MAX_PRIORITY_FEE_LIMIT'])}")
-                return Decimal(config['DYNAMIC_MAX_PRIORITY_FEE_LIMIT'])
-            else:     
-                logger.warning(f'Return calculated fee {max_fee}')
-                return max_fee
-        else:
-            raise Exception("config['MAX_PRIORITY_FEE_MODE'] is incorrect, can be only 'static' or 'dynamic'")
+        return get_max_priority_fee()
 
     def get_all_transfers(self, from_block, to_block):
         all_transfers = []
         transactions = self.provider.eth.get_logs({"fromBlock":from_block, 
                                                    "toBlock":to_block, 
                                                    "address":self.contract_address,
-                                                   "topics": ["0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef", None, None]})  
+                                                   "topics": [TRANSFER_TOPIC, None, None]})  
         for trans in transactions:
-            all_transfers.append({"txid":trans.transactionHash.hex(),
-                                  "amount": Web3.to_int(trans.data), 
-                                  "from": '0x'+trans.topics[1].hex()[24:], 
-                                  "to": '0x'+trans.topics[2].hex()[24:],
-                                  "block_number": trans.blockNumber})
+            all_transfers.append(decode_transfer_log(trans))
         return all_transfers
 
     def get_eth_transaction_price(self):
@@ -448,7 +485,7 @@ class Token:
         eth_transaction = {"from": self.provider.to_checksum_address(self.get_fee_deposit_account()),
                                 "to": self.provider.to_checksum_address(self.get_fee_deposit_account()), 
                                 "value": self.provider.to_wei(0, "ether")}  # transaction example for counting gas
-        eth_gas_count = self.provider.eth.estimate_gas(eth_transaction)
+        eth_gas_count = get_gas_estimates().get(config["COIN_SYMBOL"], True, lambda: self.provider.eth.estimate_gas(eth_transaction))
         eth_gas_count =  eth_gas_count *  Decimal(config['MULTIPLIER'])
         # for account in account_dict:
         price = eth_gas_count  * max_fee_per_gas * Decimal(config['MULTIPLIER'])
@@ -467,7 +504,7 @@ class Token:
         
     def get_account_balance_from_fullnode(self, address):
         balance = Decimal(self.contract.functions.balanceOf(self.provider.to_checksum_address(address)).call())
-        normalized_balance = balance / Decimal(10** (self.contract.functions.decimals().call()))
+        normalized_balance = self.meta.from_units(balance)
         return normalized_balance
 
     def get_token_transaction(self, txid):
@@ -512,7 +549,7 @@ class Token:
     def get_coin_transaction_fee(self):
         address = self.get_fee_deposit_account()
         fee = self.get_max_priority_fee() 
-        gas  = self.contract.functions.transfer(address, int((Decimal(0) * 10** (self.contract.functions.decimals().call())))).estimate_gas({'from': address})
+        gas  = get_gas_estimates().get(self.symbol, FEE_QUOTE, lambda: self.contract.functions.transfer(address, 0).estimate_gas({'from': address}))
         gas = int(gas * Decimal(config['MULTIPLIER']))
         gas_price = self.get_gas_price()
         max_fee_per_gas = ( Decimal(self.provider.from_wei(gas_price, "ether")) + Decimal(fee) ) #* Decimal(config['MULTIPLIER'])
@@ -520,7 +557,7 @@ class Token:
         return need_crypto
 
     def get_gas_price(self):
-        return self.provider.eth.gas_price
+        return get_fees().gas_price
 
     def check_eth_address(self, address):
         return self.provider.is_address(address)
@@ -550,6 +587,7 @@ class Token:
                 db.session.remove()
                 db.engine.dispose() 
     
+        publish_new_address(acc.address)
         logger.info(f'Created fee-deposit account and added to DB')
 
 
@@ -575,10 +613,22 @@ class Token:
     def get_fee_deposit_token_balance(self):
         deposit_account = self.get_fee_deposit_account()
         balance = Decimal(self.contract.functions.balanceOf(self.provider.to_checksum_address(deposit_account)).call())
-        normalized_balance = balance / Decimal(10** (self.contract.functions.decimals().call()))
+        normalized_balance = self.meta.from_units(balance)
         return normalized_balance
     
-    def make_token_multipayout(self, payout_list, fee,):
+    def estimate_payout_gas(self, payout_list):
+        """(gas, has_balance) of each payout transfer, the gas is cached by whether the recipient holds the token"""
+        sender = self.provider.to_checksum_address(self.get_fee_deposit_account())
+        classes = get_recipient_classes(self.symbol, [payout['dest'] for payout in payout_list])
+        gas_estimates = get_gas_estimates()
+        payout_gas = []
+        for payout in payout_list:
+            contract_call = self.contract.functions.transfer(payout['dest'], self.meta.to_units(payout['amount']))
+            has_balance = classes[payout['dest']]
+            payout_gas.append((gas_estimates.get(self.symbol, has_balance, lambda: contract_call.estimate_gas({'from': sender})), has_balance))
+        return payout_gas
+
+    def make_token_multipayout(self, payout_list, fee, disperse=False):
         payout_results = []
         payout_list = payout_list
         fee = Decimal(fee)
@@ -605,65 +655,75 @@ class Token:
         payout_account = self.get_fee_deposit_account()
       
         
-        gas  = self.contract.functions.transfer(payout_list[0]['dest'], int((Decimal(payout_list[0]['amount']) * 10** (self.contract.functions.decimals().call())))).estimate_gas({'from': payout_account})
+        payout_gas = self.estimate_payout_gas(payout_list)
+        gas_price = self.get_gas_price()
+        max_fee_per_gas = ( Decimal(self.provider.from_wei(gas_price, "ether")) + Decimal(fee) ) #* Decimal(config['MULTIPLIER'])
+        # all payout transactions, signed and sent when the funds are checked
+        recipients = [payout['dest'] for payout in payout_list]
+        values = [self.meta.to_units(payout['amount']) for payout in payout_list]
+        if disperse:
+            groups, transactions = disperse_token_transactions(self.meta.address, recipients, values, payout_gas, Decimal(config['MULTIPLIER']))
+            approval = disperse_token_approval(self.contract, self.provider.to_checksum_address(payout_account),
+                                               sum(values), Decimal(config['MULTIPLIER']))
+            if approval:
+                groups.insert(0, [])
+                transactions.insert(0, approval)
+        else:
+            groups = [[i] for i in range(len(payout_list))]
+            transactions = [{
+                'to': self.meta.address,
+                'value': 0,
+                'data': self.contract.encode_abi('transfer', args=[recipient, value]),
+                'gas': int(gas * Decimal(config['MULTIPLIER'])),
+            } for recipient, value, (gas, has_balance) in zip(recipients, values, payout_gas)]
+        nonce_manager = get_nonce_manager(payout_account)
+        nonces = nonce_manager.reserve(len(transactions))
+        fees = get_fees()
+        for tx, nonce in zip(transactions, nonces):
+            tx.update({
+                'nonce': nonce,
+                'maxFeePerGas': self.provider.to_wei(max_fee_per_gas, 'ether'),
+                'maxPriorityFeePerGas': self.provider.to_wei(fee, 'ether'),
+                'chainId': fees.chain_id,
+            })
         # ------------------------------------------------------------------
         # OPTIMISM L1 DATA FEE
         # ------------------------------------------------------------------
-        dummy_tx = self.contract.functions.transfer(
-            payout_list[0]['dest'], 
-            int((Decimal(payout_list[0]['amount']) * 10** (self.contract.functions.decimals().call())))).build_transaction({
-        "from": Web3.to_checksum_address(payout_account),
-        "nonce": self.provider.eth.get_transaction_count(payout_account)
-        })
-         
-        oracle = self.provider.eth.contract(
-             address=self.op_gas_price_oracle,
-             abi=self.op_price_oracle_abi
-        )
-        l1_fee_wei = oracle.functions.getL1Fee(dummy_tx["data"]).call()
-        l1_fee_eth = self.provider.from_wei(l1_fee_wei, "ether")
+        # computed locally from the transfer transactions which will be sent
+        l1_fee_eth = Decimal(0)
+        try:
+            for tx in transactions:
+                l1_fee_eth = l1_fee_eth + get_transaction_l1_fee(tx, fees)
+        except Exception:
+            nonce_manager.release(nonces)
+            raise
         # ------------------------------------------------------------------
         # OPTIMISM L1 DATA FEE
         # ------------------------------------------------------------------
-        gas = int(gas * Decimal(config['MULTIPLIER']))
-        gas_price = self.get_gas_price()
-        max_fee_per_gas = ( Decimal(self.provider.from_wei(gas_price, "ether")) + Decimal(fee) ) #* Decimal(config['MULTIPLIER'])
-        need_crypto = (gas * max_fee_per_gas) + l1_fee_eth
-        need_crypto_for_multipayout = need_crypto * len(payout_list) # approximate сalc just for checking 
+        need_crypto_for_multipayout = sum(tx['gas'] for tx in transactions) * max_fee_per_gas + l1_fee_eth # approximate сalc just for checking 
         have_crypto = self.get_fee_deposit_account_balance()
         if need_crypto_for_multipayout > have_crypto:
+            nonce_manager.release(nonces)
             raise Exception(f"Have not enough crypto on fee account, need {need_crypto_for_multipayout} have {have_crypto}")
         else:
-            nonce = self.provider.eth.get_transaction_count(payout_account)
-            l1_fee_wei = 0
-            for payout in payout_list:
-
-                gas  = self.contract.functions.transfer(payout['dest'], int((Decimal(payout['amount']) * 10** (self.contract.functions.decimals().call())))).estimate_gas({'from': payout_account})
-                gas = int(gas * Decimal(config['MULTIPLIER']))
-                gas_price = self.get_gas_price()
-
-
-
-                max_fee_per_gas = ( Decimal(self.provider.from_wei(gas_price, "ether")) + Decimal(fee) ) #* Decimal(config['MULTIPLIER'])
-
-                contract_call = self.contract.functions.transfer(self.provider.to_checksum_address(payout['dest']),
-                                                                 int((Decimal(payout['amount']) * 10** (self.contract.functions.decimals().call()))))
-                unsigned_txn = contract_call.build_transaction({'from': self.provider.to_checksum_address(payout_account), 
-                                                               'gas':  gas,
-                                                               'maxFeePerGas': self.provider.to_wei(max_fee_per_gas, 'ether'),
-                                                               'maxPriorityFeePerGas': self.provider.to_wei(Decimal(fee), 'ether'),
-                                                               'nonce': nonce,
-                                                               'chainId': self.provider.eth.chain_id})   
-                signed_txn = self.provider.eth.account.sign_transaction(unsigned_txn, private_key= self.get_seed_from_address(payout_account)) 
-                txid = self.provider.eth.send_raw_transaction(signed_txn.raw_transaction)                                            
-
-                payout_results.append({
-                "dest": payout['dest'],
-                "amount": float(payout['amount']),
-                "status": "success",
-                "txids": [txid.hex()],
-            })
-                nonce = nonce + 1
+            try:
+                raw_transactions = sign_transactions(self.get_seed_from_address(payout_account), transactions)
+            except Exception:
+                nonce_manager.release(nonces)
+                raise
+            sent = send_raw_transactions(raw_transactions)
+            nonce_manager.settle(nonces, [error for txid, error in sent])
+
+            gas_estimates = get_gas_estimates()
+            for (txid, error), tx, group in zip(sent, transactions, groups):
+                # the approval is not estimated from the cache
+                if not group:
+                    continue
+                if error is None:
+                    gas_estimates.track(self.symbol, txid, tx['gas'])
+                else:
+                    gas_estimates.invalidate(self.symbol)
+            payout_results = make_payout_results(payout_list, sent, groups)
                 
         return payout_results
      
@@ -694,7 +754,7 @@ class Token:
             return False
         else:            
             fee = self.get_max_priority_fee() 
-            gas  = self.contract.functions.transfer(destination, int((Decimal(can_send) * 10** (self.contract.functions.decimals().call())))).estimate_gas({'from': account})
+            gas  = self.contract.functions.transfer(destination, self.meta.to_units(can_send)).estimate_gas({'from': account})
             gas = int(gas * Decimal(config['MULTIPLIER']))
             gas_price = self.get_gas_price()
             max_fee_per_gas = ( Decimal(self.provider.from_wei(gas_price, "ether")) + Decimal(fee) ) * Decimal(config['MULTIPLIER'])
@@ -702,19 +762,15 @@ class Token:
             # ------------------------------------------------------------------
             # OPTIMISM L1 DATA FEE
             # ------------------------------------------------------------------
-            dummy_tx = self.contract.functions.transfer(
-                destination, 
-                int((Decimal(can_send) * 10** (self.contract.functions.decimals().call())))).build_transaction({
-            "from": Web3.to_checksum_address(account),
-            "nonce": self.provider.eth.get_transaction_count(account)
-            })
-             
-            oracle = self.provider.eth.contract(
-                 address=self.op_gas_price_oracle,
-                 abi=self.op_price_oracle_abi
-            )
-            l1_fee_wei = oracle.functions.getL1Fee(dummy_tx["data"]).call()
-            l1_fee_eth = Decimal(self.provider.from_wei(l1_fee_wei, "ether"))
+            l1_fee_eth = Decimal(get_transaction_l1_fee({
+                'to': self.meta.address,
+                'data': self.contract.encode_abi('transfer', args=[destination, self.meta.to_units(can_send)]),
+                'nonce': self.provider.eth.get_transaction_count(account),
+                'gas': gas,
+                'maxFeePerGas': self.provider.to_wei(max_fee_per_gas, 'ether'),
+                'maxPriorityFeePerGas': self.provider.to_wei(fee, 'ether'),
+                'chainId': get_fees().chain_id,
+            }))
             # ------------------------------------------------------------------
             # OPTIMISM L1 DATA FEE
             # ------------------------------------------------------------------
@@ -729,34 +785,46 @@ class Token:
                 transaction = {"from": self.provider.to_checksum_address(self.get_fee_deposit_account()),
                                "to": self.provider.to_checksum_address(account), 
                                "value": self.provider.to_wei(0, "ether")}  # transaction example for counting gas
-                gas_coin_count = int(self.provider.eth.estimate_gas(transaction) *  Decimal(config['MULTIPLIER'])) #make it bigger for sure
+                gas_coin_count = int(get_gas_estimates().get(config["COIN_SYMBOL"], False, lambda: self.provider.eth.estimate_gas(transaction)) *  Decimal(config['MULTIPLIER'])) #make it bigger for sure
                 max_fee_per_gas_coin = ( Decimal(self.provider.from_wei(gas_price, "ether")) + Decimal(fee) ) * Decimal(config['MULTIPLIER'])
 
+                nonce_manager = get_nonce_manager(self.get_fee_deposit_account())
+                nonce = nonce_manager.reserve()[0]
                 tx = {
                     'from': self.provider.to_checksum_address(self.get_fee_deposit_account()), 
                     'to': self.provider.to_checksum_address(account),
                     'value': self.provider.to_hex(self.provider.to_wei(need_to_send, "ether")),
-                    'nonce': self.provider.eth.get_transaction_count(self.get_fee_deposit_account()),
+                    'nonce': nonce,
                     'gas':  self.provider.to_hex(gas_coin_count),
                     'maxFeePerGas': self.provider.to_hex(self.provider.to_wei(max_fee_per_gas_coin, 'ether')),
                     'maxPriorityFeePerGas': self.provider.to_hex(self.provider.to_wei(fee, "ether")),
-                    'chainId': self.provider.eth.chain_id
+                    'chainId': get_fees().chain_id
                 }
-                signed_tx = self.provider.eth.account.sign_transaction(tx, self.get_seed_from_address(self.get_fee_deposit_account()))
-                txid = self.provider.eth.send_raw_transaction(signed_tx.raw_transaction)
-    
+                try:
+                    signed_tx = self.provider.eth.account.sign_transaction(tx, self.get_seed_from_address(self.get_fee_deposit_account()))
+                except Exception:
+                    nonce_manager.release([nonce])
+                    raise
+                try:
+                    txid = self.provider.eth.send_raw_transaction(signed_tx.raw_transaction)
+                except Web3RPCError as e:
+                    # the node answered, settle() releases the nonce only if it was rejected for sure
+                    nonce_manager.settle([nonce], [str(e)])
+                    raise
+                # on a timeout or a dropped connection the node may have accepted it,
+                # the nonce is kept and resync() takes care of it if it never arrives
                
                 logger.warning(f'send coins to token account: {str(txid.hex())}')
                 time.sleep(int(config['SLEEP_AFTER_SEEDING']))
 
             contract_call = self.contract.functions.transfer(self.provider.to_checksum_address(destination),
-                                                             int((Decimal(can_send) * 10** (self.contract.functions.decimals().call()))))
+                                                             self.meta.to_units(can_send))
             unsigned_txn = contract_call.build_transaction({'from': self.provider.to_checksum_address(account.lower()), 
                                                            'gas':  gas,
                                                            'maxFeePerGas': self.provider.to_wei(max_fee_per_gas, 'ether'),
                                                            'maxPriorityFeePerGas': self.provider.to_wei(Decimal(self.get_max_priority_fee()), 'ether'), 
                                                            'nonce': self.provider.eth.get_transaction_count(account),
-                                                           'chainId': self.provider.eth.chain_id})   
+                                                           'chainId': get_fees().chain_id})   
             signed_txn = self.provider.eth.account.sign_transaction(unsigned_txn, private_key= self.get_seed_from_address(account)) 
             txid = self.provider.eth.send_raw_transaction(signed_txn.raw_transaction)                                            
     
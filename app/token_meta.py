@@ -0,0 +1,55 @@
+import threading
+from decimal import Decimal
+
+from web3 import Web3
+
+from .config import config, get_contract_address
+from .logging import logger
+from .rpc import get_token_contract
+
+
+class TokenMeta:
+    """
+    Immutable token metadata. Amounts are converted with the cached 10 ** decimals,
+    without decimals() calls. Float amounts are rejected, they are not exact.
+    """
+
+    __slots__ = ('symbol', 'address', 'decimals', 'scale')
+
+    def __init__(self, symbol, address, decimals):
+        self.symbol = symbol
+        self.address = Web3.to_checksum_address(address)
+        self.decimals = decimals
+        self.scale = 10 ** decimals
+
+    def to_units(self, amount) -> int:
+        """Token amount (Decimal, int or str) to integer units, the fraction below one unit is dropped"""
+        if isinstance(amount, float):
+            raise TypeError(f"{self.symbol} amount {amount!r} is a float, pass a Decimal or str")
+        return int(Decimal(str(amount)) * self.scale)
+
+    def from_units(self, units) -> Decimal:
+        return Decimal(units) / self.scale
+
+
+token_registry = {}
+token_registry_lock = threading.Lock()
+
+
+def get_token_meta(symbol):
+    """
+    Metadata of a token from config. decimals are taken from the token config if set,
+    otherwise read from the contract once per process.
+    """
+    meta = token_registry.get(symbol)
+    if meta is None:
+        with token_registry_lock:
+            meta = token_registry.get(symbol)
+            if meta is None:
+                decimals = config['TOKENS'][config["CURRENT_OP_NETWORK"]][symbol].get('decimals')
+                if decimals is None:
+                    decimals = get_token_contract(symbol).functions.decimals().call()
+                    logger.warning(f"{symbol} decimals are not in config, got {decimals} from the contract")
+                meta = TokenMeta(symbol, get_contract_address(symbol), decimals)
+                token_registry[symbol] = meta
+    return meta
@@ -0,0 +1,73 @@
+from web3 import Web3
+
+from .logging import logger
+
+
+TRACER = {'tracer': 'callTracer'}
+# call frames which can move ETH to their 'to' address
+VALUE_CALL_TYPES = {'CALL', 'CREATE', 'CREATE2', 'SELFDESTRUCT'}
+
+
+def flatten_value_transfers(frame):
+    """
+    (to, value in wei) of internal calls with value > 0 from a callTracer result, in execution order.
+    The top frame is the transaction itself and is not included.
+    Reverted frames are skipped together with their subcalls.
+    """
+    stack = [(frame, 0)]
+    while stack:
+        frame, depth = stack.pop()
+        if frame.get('error'):
+            continue
+        value = int(frame.get('value') or '0x0', 16)
+        if depth and value and frame.get('type') in VALUE_CALL_TYPES and frame.get('to'):
+            yield frame['to'], value
+        for call in reversed(frame.get('calls', [])):
+            stack.append((call, depth + 1))
+
+
+def get_transfers_from_traces(traces, tx_hashes, list_accounts):
+    """
+    [(txid, raw address, value in wei), ...] of internal ETH transfers to our accounts
+    in a debug_traceBlockByNumber result. Values are summed per transaction and address.
+    """
+    transfers = {}
+    for i, trace in enumerate(traces):
+        # older nodes do not return txHash, traces are in the block order then
+        txid = trace.get('txHash') or tx_hashes[i]
+        txid = txid[2:] if txid.startswith('0x') else txid
+        for to, value in flatten_value_transfers(trace['result']):
+            if to in list_accounts:
+                key = (txid, bytes.fromhex(to[2:]))
+                transfers[key] = transfers.get(key, 0) + value
+    return [(txid, address, value) for (txid, address), value in transfers.items()]
+
+
+def trace_blocks(provider, blocks, list_accounts):
+    """
+    Internal ETH transfers to our accounts in RawBlocks, with one debug_traceBlockByNumber per block
+    sent as a single JSON-RPC batch. Returns {block number: [(txid, raw address, value in wei), ...]}.
+    """
+    blocks = [block for block in blocks if block.transactions]
+    if not blocks:
+        return {}
+    responses = provider.provider.make_batch_request(
+        [('debug_traceBlockByNumber', [hex(block.number), TRACER]) for block in blocks])
+    if not isinstance(responses, list):
+        raise Exception(f"debug_traceBlockByNumber failed: {responses.get('error')}")
+
+    internal_transfers = {}
+    for block, response in zip(blocks, responses):
+        if 'error' in response:
+            raise Exception(f"debug_traceBlockByNumber failed for block {block.number}: {response['error']}")
+        tx_hashes = [transaction.hash for transaction in block.transactions]
+        internal_transfers[block.number] = get_transfers_from_traces(response['result'], tx_hashes, list_accounts)
+    return internal_transfers
+
+
+def trace_transaction(provider, txid, list_accounts):
+    """[(checksum address, value in wei), ...] of internal ETH transfers to our accounts in a transaction"""
+    trace = provider.manager.request_blocking('debug_traceTransaction', [txid, TRACER])
+    transfers = get_transfers_from_traces([{'txHash': txid, 'result': trace}], [txid], list_accounts)
+    logger.warning(f"Internal transfers to our accounts in {txid} from trace: {transfers}")
+    return [(Web3.to_checksum_address(address), value) for _, address, value in transfers]
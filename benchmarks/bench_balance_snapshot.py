@@ -0,0 +1,127 @@
+"""
+Benchmark of balance refresh against a local stand-in node.
+
+The stand-in answers eth_getBalance, balanceOf, decimals and Multicall3
+aggregate3 (getEthBalance / balanceOf subcalls) from deterministic balances,
+after 1 ms of simulated node latency per request. Compares the old refresh_balances
+RPC pattern (2 eth_getBalance + balanceOf and decimals per token, per account)
+with app.multicall.get_balance_snapshot and checks they return the same balances.
+
+    python -m benchmarks.bench_balance_snapshot
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_abi import decode, encode
+from eth_utils import keccak
+
+from app.config import config, get_contract_address
+
+
+ACCOUNTS = 2_000
+LATENCY = 0.001
+
+GET_BALANCE = keccak(text='getEthBalance(address)')[:4]
+BALANCE_OF = keccak(text='balanceOf(address)')[:4]
+DECIMALS = keccak(text='decimals()')[:4]
+
+
+def balance(account: bytes, asset: int):
+    return int.from_bytes(keccak(account + bytes([asset]))[:6], 'big')
+
+
+class StandInNode:
+    """Answers eth_getBalance and eth_call like a node with balance(account, asset) balances"""
+
+    def __init__(self):
+        self.requests = 0
+        self.tokens = {bytes.fromhex(get_contract_address(token)[2:]): i + 1
+                       for i, token in enumerate(config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys())}
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                node.requests += 1
+                time.sleep(LATENCY)
+                if isinstance(request, list):
+                    response = [node.answer(r) for r in request]
+                else:
+                    response = node.answer(request)
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def call(self, target, data):
+        if data[:4] == GET_BALANCE:
+            return balance(data[16:36], 0).to_bytes(32, 'big')
+        if data[:4] == BALANCE_OF:
+            return balance(data[16:36], self.tokens[target]).to_bytes(32, 'big')
+        if data[:4] == DECIMALS:
+            return (6).to_bytes(32, 'big')
+        calls = decode(['(address,bool,bytes)[]'], data[4:])[0]
+        results = [(True, self.call(bytes.fromhex(target[2:]), call_data)) for target, allow_failure, call_data in calls]
+        return encode(['(bool,bytes)[]'], [results])
+
+    def answer(self, request):
+        if request['method'] == 'eth_blockNumber':
+            result = '0x64'
+        elif request['method'] == 'eth_chainId':
+            result = '0xa'
+        elif request['method'] == 'eth_getBalance':
+            result = hex(balance(bytes.fromhex(request['params'][0][2:]), 0))
+        else:
+            transaction = request['params'][0]
+            result = '0x' + self.call(bytes.fromhex(transaction['to'][2:]), bytes.fromhex(transaction['data'][2:])).hex()
+        return {'jsonrpc': '2.0', 'id': request['id'], 'result': result}
+
+
+def main():
+    node = StandInNode()
+    config['FULLNODE_URL'] = node.url
+    from app.multicall import get_balance_snapshot
+    from app.rpc import get_token_contract, get_w3
+
+    w3 = get_w3()
+    tokens = list(config['TOKENS'][config["CURRENT_OP_NETWORK"]].keys())
+    accounts = [w3.to_checksum_address(os.urandom(20)) for _ in range(ACCOUNTS)]
+
+    node.requests = 0
+    started = time.perf_counter()
+    old = {}
+    for account in accounts:
+        w3.eth.get_balance(account)
+        row = {config["COIN_SYMBOL"]: w3.eth.get_balance(account)}
+        for token in tokens:
+            contract = get_token_contract(token)
+            row[token] = contract.functions.balanceOf(account).call()
+            contract.functions.decimals().call()
+        old[account] = row
+    old_time, old_requests = time.perf_counter() - started, node.requests
+
+    node.requests = 0
+    started = time.perf_counter()
+    snapshot = get_balance_snapshot(accounts)
+    new_time, new_requests = time.perf_counter() - started, node.requests
+
+    assert dict(snapshot.rows()) == old
+    print(f"{ACCOUNTS} accounts, {len(tokens)} tokens, {LATENCY * 1000:.0f} ms per request")
+    print(f"per account RPC: {old_time:6.2f} s, {old_requests} requests")
+    print(f"multicall:       {new_time:6.2f} s, {new_requests} requests ({old_time / new_time:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
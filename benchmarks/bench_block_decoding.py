@@ -0,0 +1,90 @@
+"""
+Benchmark of block decoding in the scanner.
+
+Compares json.loads of an eth_getBlockByNumber batch response followed by
+web3 result formatters and AttributeDicts, as w3.batch_requests() does, with
+app.raw_blocks decoding into RawBlocks, on 20 blocks of 300 transactions.
+
+    python -m benchmarks.bench_block_decoding
+"""
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from web3._utils.method_formatters import PYTHONIC_RESULT_FORMATTERS
+from web3._utils.rpc_abi import RPC
+from web3.datastructures import AttributeDict
+
+from app.raw_blocks import RawBlock, iter_batch_response
+
+
+BLOCKS = 20
+BLOCK_TXS = 300
+ROUNDS = 3
+
+
+def random_hex(size):
+    return '0x' + os.urandom(size).hex()
+
+
+def make_transaction(number, index):
+    return {'blockHash': random_hex(32), 'blockNumber': hex(number), 'chainId': '0xa',
+            'from': random_hex(20), 'gas': '0x5208', 'gasPrice': '0x3b9aca00',
+            'maxFeePerGas': '0x3b9aca00', 'maxPriorityFeePerGas': '0x1',
+            'hash': random_hex(32), 'input': random_hex(4 + 32 * random.randint(0, 8)),
+            'nonce': hex(index), 'to': random_hex(20), 'transactionIndex': hex(index),
+            'value': '0x0', 'type': '0x2', 'accessList': [], 'v': '0x1',
+            'r': random_hex(32), 's': random_hex(32), 'yParity': '0x1'}
+
+
+def make_response():
+    batch = []
+    for number in range(BLOCKS):
+        block = {'number': hex(number), 'hash': random_hex(32), 'parentHash': random_hex(32),
+                 'logsBloom': random_hex(256), 'miner': random_hex(20), 'gasLimit': '0x1c9c380',
+                 'gasUsed': '0x5208', 'timestamp': '0x65000000', 'baseFeePerGas': '0x1',
+                 'difficulty': '0x0', 'extraData': '0x', 'mixHash': random_hex(32), 'nonce': '0x0000000000000000',
+                 'receiptsRoot': random_hex(32), 'sha3Uncles': random_hex(32), 'size': '0x1000',
+                 'stateRoot': random_hex(32), 'totalDifficulty': '0x0', 'transactionsRoot': random_hex(32),
+                 'uncles': [], 'withdrawals': [], 'withdrawalsRoot': random_hex(32),
+                 'transactions': [make_transaction(number, i) for i in range(BLOCK_TXS)]}
+        batch.append({'jsonrpc': '2.0', 'id': number, 'result': block})
+    return json.dumps(batch)
+
+
+def web3_decoding(text):
+    formatter = PYTHONIC_RESULT_FORMATTERS[RPC.eth_getBlockByNumber]
+    return [AttributeDict.recursive(formatter(element['result'])) for element in json.loads(text)]
+
+
+def raw_decoding(text):
+    return [RawBlock(element['result']) for element in iter_batch_response(text)]
+
+
+def measure(func, text):
+    best = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        func(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    blocks = func(text)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(blocks) == BLOCKS
+    return best, size, peak
+
+
+def main():
+    text = make_response()
+    print(f"{BLOCKS} blocks, {BLOCK_TXS} transactions each, {len(text) / 2**20:.1f} MiB response")
+    for name, func in (('web3', web3_decoding), ('raw', raw_decoding)):
+        elapsed, size, peak = measure(func, text)
+        print(f"{name:5} {elapsed * 1000:7.1f} ms, blocks {size / 2**20:5.1f} MiB, peak {peak / 2**20:5.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
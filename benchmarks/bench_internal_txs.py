@@ -0,0 +1,76 @@
+"""
+Benchmark of the internal transaction detector on a big account set.
+
+Builds InternalTransfersDetector for 100k addresses, adds 1k more
+incrementally and scans a 2k transactions block with contract calldata,
+to compare with the 2 seconds Optimism block time.
+
+    python -m benchmarks.bench_internal_txs
+"""
+import logging
+import os
+import random
+import time
+from types import SimpleNamespace
+
+from app.address_index import AddressIndex
+from app.internal_txs import InternalTransfersDetector
+from app.raw_blocks import RawTransaction
+from app.logging import logger
+
+
+ACCOUNTS = 100_000
+NEW_ACCOUNTS = 1_000
+BLOCK_TXS = 2_000
+RELATED = 0.005
+
+
+def random_address():
+    return '0x' + os.urandom(20).hex()
+
+
+def make_block(accounts):
+    transactions = []
+    for i in range(BLOCK_TXS):
+        # typical contract call: selector and a few 32 bytes arguments
+        arguments = [os.urandom(32) for _ in range(random.randint(2, 10))]
+        if random.random() < RELATED:
+            arguments[0] = random.choice(accounts).rjust(32, b'\0')
+        transactions.append(RawTransaction('0x' + os.urandom(32).hex(),
+                                           random_address(),
+                                           random_address(),
+                                           '0x' + (os.urandom(4) + b''.join(arguments)).hex()))
+    return SimpleNamespace(number=1, transactions=transactions)
+
+
+def main():
+    logger.setLevel(logging.ERROR) # every found transaction is logged
+    index = AddressIndex()
+    for _ in range(ACCOUNTS):
+        index.add(random_address())
+    detector = InternalTransfersDetector()
+
+    started = time.perf_counter()
+    detector.update_accounts(index)
+    print(f"build for {ACCOUNTS} addresses: {time.perf_counter() - started:.2f} s")
+
+    for _ in range(NEW_ACCOUNTS):
+        index.add(random_address())
+    started = time.perf_counter()
+    detector.update_accounts(index)
+    print(f"update with {NEW_ACCOUNTS} new addresses: {time.perf_counter() - started:.2f} s")
+
+    started = time.perf_counter()
+    detector.update_accounts(index)
+    print(f"update without changes: {(time.perf_counter() - started) * 1000:.3f} ms")
+
+    block = make_block(index.ordered)
+    started = time.perf_counter()
+    found = detector.scan_block(block, index)
+    elapsed = time.perf_counter() - started
+    print(f"scan of {BLOCK_TXS} transactions block: {elapsed * 1000:.1f} ms, {len(found)} found "
+          f"({elapsed / 2 * 100:.1f}% of 2 s block time)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of the block scanner matching path.
+
+Compares the old token transfer matching (checksum conversion of every
+from/to and a set of checksum strings) with app.events.match_batch
+on 10k Transfer logs, 1% of them related to our accounts.
+
+    python -m benchmarks.bench_matching
+"""
+import logging
+import os
+import random
+import time
+
+from web3 import Web3
+
+from app.address_index import AddressIndex
+from app.events import match_batch
+from app.logging import logger
+
+
+LOGS = 10_000
+ACCOUNTS = 10_000
+RELATED = 0.01
+ROUNDS = 5
+
+
+def random_address():
+    return '0x' + os.urandom(20).hex()
+
+
+def old_matching(transfers, list_accounts):
+    found = []
+    for token, token_transfers in transfers.items():
+        for transaction in token_transfers:
+            if (Web3.to_checksum_address(transaction['from']) in list_accounts or 
+                Web3.to_checksum_address(transaction['to']) in list_accounts):
+                drain_address = None
+                if (Web3.to_checksum_address(transaction['from']) not in list_accounts and 
+                    Web3.to_checksum_address(transaction['to']) in list_accounts):
+                    drain_address = Web3.to_checksum_address(transaction['to'])
+                found.append((token, transaction['txid'], drain_address))
+    return found
+
+
+def best_of(func, *args):
+    best = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    logger.setLevel(logging.WARNING) # handle_event logs every match on INFO
+    accounts = [random_address() for _ in range(ACCOUNTS)]
+    transfers = {'OP-USDC': []}
+    for i in range(LOGS):
+        sender = random_address()
+        receiver = random.choice(accounts) if random.random() < RELATED else random_address()
+        transfers['OP-USDC'].append({"txid": os.urandom(32).hex(), "amount": i, 
+                                     "from": sender, "to": receiver, "block_number": i})
+
+    checksum_accounts = {Web3.to_checksum_address(address) for address in accounts}
+    index = AddressIndex()
+    for address in accounts:
+        index.add(address)
+
+    old_time, old_found = best_of(old_matching, transfers, checksum_accounts)
+    new_time, new_found = best_of(match_batch, [], transfers, index, True)
+    assert old_found == new_found
+
+    print(f"{LOGS} logs, {ACCOUNTS} accounts, {len(new_found)} related")
+    print(f"before: {old_time * 1000:.1f} ms")
+    print(f"after:  {new_time * 1000:.1f} ms ({old_time / new_time:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
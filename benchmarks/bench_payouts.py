@@ -0,0 +1,119 @@
+"""
+Benchmark of payout submission against a local stand-in node.
+
+The stand-in answers eth_estimateGas, eth_gasPrice, eth_chainId and
+eth_sendRawTransaction after 1 ms of simulated node latency per request, and
+accepts a raw transaction only if it carries the sender's next nonce. Compares
+the old per-row payout loop (estimate, gas price, chain id, sign, send per
+payout) with app.payouts sign_transactions + send_raw_transactions.
+
+    python -m benchmarks.bench_payouts
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import rlp
+from eth_account import Account
+from eth_utils import keccak
+
+from app.config import config
+
+
+PAYOUTS = 1_000
+LATENCY = 0.001
+
+
+class StandInNode:
+    """Accepts transactions with sequential nonces, counts requests"""
+
+    def __init__(self):
+        self.requests = 0
+        self.nonce = 0
+        self.lock = threading.Lock()
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                node.requests += 1
+                time.sleep(LATENCY)
+                if isinstance(request, list):
+                    response = [node.answer(r) for r in request]
+                else:
+                    response = node.answer(request)
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def send(self, raw):
+        nonce = int.from_bytes(rlp.decode(raw[1:])[1], 'big')
+        with self.lock:
+            if nonce != self.nonce:
+                raise Exception(f"nonce {nonce} is not the next one {self.nonce}")
+            self.nonce += 1
+        return '0x' + keccak(raw).hex()
+
+    def answer(self, request):
+        response = {'jsonrpc': '2.0', 'id': request['id']}
+        try:
+            if request['method'] == 'eth_estimateGas':
+                response['result'] = hex(21000)
+            elif request['method'] == 'eth_gasPrice':
+                response['result'] = hex(10 ** 6)
+            elif request['method'] == 'eth_chainId':
+                response['result'] = '0xa'
+            elif request['method'] == 'eth_sendRawTransaction':
+                response['result'] = self.send(bytes.fromhex(request['params'][0][2:]))
+        except Exception as e:
+            response['error'] = {'code': -32000, 'message': str(e)}
+        return response
+
+
+def main():
+    node = StandInNode()
+    config['FULLNODE_URL'] = node.url
+    from app.payouts import send_raw_transactions, sign_transactions
+    from app.rpc import get_w3
+
+    w3 = get_w3()
+    sender = Account.create()
+    destinations = [Account.create().address for _ in range(PAYOUTS)]
+
+    node.requests = 0
+    started = time.perf_counter()
+    for nonce, destination in enumerate(destinations):
+        transaction = {'from': sender.address, 'to': destination, 'value': 1}
+        gas = w3.eth.estimate_gas(transaction)
+        tx = {'to': destination, 'value': 1, 'nonce': nonce, 'gas': gas, 'maxFeePerGas': w3.eth.gas_price * 2,
+              'maxPriorityFeePerGas': 1, 'chainId': w3.eth.chain_id}
+        w3.eth.send_raw_transaction(Account.sign_transaction(tx, sender.key).raw_transaction)
+    old_time, old_requests = time.perf_counter() - started, node.requests
+
+    node.nonce = 0
+    node.requests = 0
+    started = time.perf_counter()
+    transactions = [{'to': destination, 'value': 1, 'nonce': nonce, 'gas': 21000, 'maxFeePerGas': 2 * 10 ** 6,
+                     'maxPriorityFeePerGas': 1, 'chainId': 10} for nonce, destination in enumerate(destinations)]
+    sent = send_raw_transactions(sign_transactions(sender.key, transactions))
+    new_time, new_requests = time.perf_counter() - started, node.requests
+
+    assert all(error is None for txid, error in sent) and node.nonce == PAYOUTS
+    print(f"{PAYOUTS} payouts, {LATENCY * 1000:.0f} ms per request")
+    print(f"per row:   {old_time:6.2f} s, {old_requests} requests, {PAYOUTS / old_time * 60:8.0f} payouts/min")
+    print(f"pipelined: {new_time:6.2f} s, {new_requests} requests, {PAYOUTS / new_time * 60:8.0f} payouts/min")
+
+
+if __name__ == '__main__':
+    main()
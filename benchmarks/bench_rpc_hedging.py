@@ -0,0 +1,99 @@
+"""
+Benchmark of the multi-endpoint RPC client against local stub fullnodes.
+
+Three stub JSON-RPC servers answer eth_getBlockByNumber: a fast one which
+stalls for 2 s on 5% of requests, a steady one, and one which fails every
+request. Prints latency percentiles of the single endpoint setup and of
+app.rpc.RpcClient with hedging and circuit breaking, and checks that
+eth_sendRawTransaction goes only to the primary.
+
+    python -m benchmarks.bench_rpc_hedging
+"""
+import json
+import logging
+import random
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.config import config
+from app.logging import logger
+from app.rpc import RpcClient
+
+
+REQUESTS = 400
+
+
+class StubNode:
+    """JSON-RPC server answering after delay() seconds, or with HTTP 503 if failing"""
+
+    def __init__(self, delay, failing=False):
+        self.delay = delay
+        self.failing = failing
+        self.methods = []
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                node.methods.append(request['method'])
+                time.sleep(node.delay())
+                if node.failing:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                body = json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': '0x1'}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+
+def request(method):
+    return json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': []}).encode()
+
+
+def measure(client):
+    latencies = []
+    for _ in range(REQUESTS):
+        started = time.perf_counter()
+        client.post(request('eth_getBlockByNumber'))
+        latencies.append(time.perf_counter() - started)
+    percentiles = statistics.quantiles(latencies, n=100)
+    return statistics.median(latencies), percentiles[94], percentiles[98]
+
+
+def main():
+    logger.setLevel(logging.ERROR) # failed requests are logged
+    config['RPC_HEDGE_DELAY'] = 0.05
+    jittery = StubNode(lambda: 2 if random.random() < 0.05 else 0.005)
+    steady = StubNode(lambda: 0.02)
+    broken = StubNode(lambda: 0.001, failing=True)
+
+    for name, urls in (('single endpoint', [jittery.url]),
+                       ('3 endpoints', [jittery.url, steady.url, broken.url])):
+        p50, p95, p99 = measure(RpcClient(urls))
+        print(f"{name:16} p50 {p50 * 1000:6.1f} ms, p95 {p95 * 1000:6.1f} ms, p99 {p99 * 1000:6.1f} ms")
+    print(f"requests to the failing endpoint: {len(broken.methods)} "
+          f"(breaker opens after {config['RPC_BREAKER_FAILURES']} failures)")
+
+    client = RpcClient([steady.url, jittery.url])
+    steady.methods.clear()
+    jittery.methods.clear()
+    for _ in range(20):
+        client.post(request('eth_sendRawTransaction'))
+    assert steady.methods == ['eth_sendRawTransaction'] * 20 and not jittery.methods
+    print("eth_sendRawTransaction went only to the primary")
+
+
+if __name__ == '__main__':
+    main()
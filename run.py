@@ -9,6 +9,13 @@ events_listener_thread = threading.Thread(
 )
 events_listener_thread.start()
 
+notifications_sender_thread = threading.Thread(
+    daemon=True,
+    name="Notifications sender",
+    target=app.outbox.notifications_sender,
+)
+notifications_sender_thread.start()
+
 server = app.create_app()
 
 if __name__ == '__main__':
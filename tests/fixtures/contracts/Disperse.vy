@@ -0,0 +1,28 @@
+# pragma version ~=0.4.3
+"""
+Disperse (disperse.app) for the tests: the ABI and the transfers of Disperse.sol,
+with recipient lists bounded by MAX_RECIPIENTS.
+"""
+from ethereum.ercs import IERC20
+
+MAX_RECIPIENTS: constant(uint256) = 256
+
+
+@external
+@payable
+def disperseEther(recipients: DynArray[address, MAX_RECIPIENTS], values: DynArray[uint256, MAX_RECIPIENTS]):
+    for i: uint256 in range(len(recipients), bound=MAX_RECIPIENTS):
+        # 2300 gas stipend only, as address.transfer() in Disperse.sol
+        send(recipients[i], values[i])
+    if self.balance > 0:
+        send(msg.sender, self.balance)
+
+
+@external
+def disperseToken(token: IERC20, recipients: DynArray[address, MAX_RECIPIENTS], values: DynArray[uint256, MAX_RECIPIENTS]):
+    total: uint256 = 0
+    for value: uint256 in values:
+        total += value
+    assert extcall token.transferFrom(msg.sender, self, total)
+    for i: uint256 in range(len(recipients), bound=MAX_RECIPIENTS):
+        assert extcall token.transfer(recipients[i], values[i])
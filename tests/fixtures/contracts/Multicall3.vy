@@ -0,0 +1,39 @@
+# pragma version ~=0.4.3
+"""
+Multicall3 (multicall3.com) for the tests: aggregate3 and getEthBalance with the ABI
+of Multicall3.sol. Calls are bounded by MAX_CALLS, return data is cut to MAX_RETURNDATA.
+"""
+
+MAX_CALLS: constant(uint256) = 512
+MAX_CALLDATA: constant(uint256) = 256
+MAX_RETURNDATA: constant(uint256) = 64
+
+
+struct Call3:
+    target: address
+    allowFailure: bool
+    callData: Bytes[MAX_CALLDATA]
+
+
+struct Result:
+    success: bool
+    returnData: Bytes[MAX_RETURNDATA]
+
+
+@external
+@payable
+def aggregate3(calls: DynArray[Call3, MAX_CALLS]) -> DynArray[Result, MAX_CALLS]:
+    results: DynArray[Result, MAX_CALLS] = []
+    for c: Call3 in calls:
+        success: bool = False
+        data: Bytes[MAX_RETURNDATA] = b""
+        success, data = raw_call(c.target, c.callData, max_outsize=MAX_RETURNDATA, revert_on_failure=False)
+        assert success or c.allowFailure, "Multicall3: call failed"
+        results.append(Result(success=success, returnData=data))
+    return results
+
+
+@view
+@external
+def getEthBalance(addr: address) -> uint256:
+    return addr.balance
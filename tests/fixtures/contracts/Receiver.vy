@@ -0,0 +1,10 @@
+# pragma version ~=0.4.3
+"""Contract recipient which needs more than the 2300 gas stipend to accept ETH"""
+
+received: public(uint256)
+
+
+@external
+@payable
+def __default__():
+    self.received += msg.value
@@ -0,0 +1,40 @@
+# pragma version ~=0.4.3
+"""ERC20 token for the tests, the whole supply is minted to the deployer"""
+from ethereum.ercs import IERC20
+
+implements: IERC20
+
+balanceOf: public(HashMap[address, uint256])
+allowance: public(HashMap[address, HashMap[address, uint256]])
+totalSupply: public(uint256)
+
+
+@deploy
+def __init__(supply: uint256):
+    self.balanceOf[msg.sender] = supply
+    self.totalSupply = supply
+    log IERC20.Transfer(sender=empty(address), receiver=msg.sender, value=supply)
+
+
+@external
+def transfer(receiver: address, amount: uint256) -> bool:
+    self.balanceOf[msg.sender] -= amount
+    self.balanceOf[receiver] += amount
+    log IERC20.Transfer(sender=msg.sender, receiver=receiver, value=amount)
+    return True
+
+
+@external
+def transferFrom(sender: address, receiver: address, amount: uint256) -> bool:
+    self.allowance[sender][msg.sender] -= amount
+    self.balanceOf[sender] -= amount
+    self.balanceOf[receiver] += amount
+    log IERC20.Transfer(sender=sender, receiver=receiver, value=amount)
+    return True
+
+
+@external
+def approve(spender: address, amount: uint256) -> bool:
+    self.allowance[msg.sender][spender] = amount
+    log IERC20.Approval(owner=msg.sender, spender=spender, value=amount)
+    return True
@@ -0,0 +1,49 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInHttpNode:
+    """
+    Local JSON-RPC fullnode answering after delay seconds, or with HTTP 503 if failing.
+    eth_blockNumber returns head, other methods return the name of the node.
+    Methods of the received requests are kept in methods.
+    """
+
+    def __init__(self, name, delay=0, failing=False, head=100):
+        self.name = name
+        self.delay = delay
+        self.failing = failing
+        self.head = head
+        self.methods = []
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                node.methods.append(request['method'])
+                time.sleep(node.delay)
+                if node.failing:
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                result = hex(node.head) if request['method'] == 'eth_blockNumber' else node.name
+                body = json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': result}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(daemon=True, name=f"HTTP stand-in node {name}", target=self.server.serve_forever).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,44 @@
+import json
+import os
+
+from web3 import EthereumTesterProvider, Web3
+
+
+CONTRACTS = os.path.join(os.path.dirname(__file__), 'fixtures', 'contracts')
+
+
+class BatchingTesterProvider(EthereumTesterProvider):
+    """
+    eth-tester provider answering JSON-RPC batches as the fullnode does, with an error per request.
+    eth_call params are given as eth-tester wants them: with a funded sender, which fullnodes
+    do not need, and an integer block number. The sender is the last account, its balance
+    is short of the gas of the call inside it.
+    """
+
+    def make_batch_request(self, requests):
+        responses = []
+        for i, (method, params) in enumerate(requests):
+            if method == 'eth_call':
+                block = params[1] if len(params) > 1 else 'latest'
+                if block.startswith('0x'):
+                    block = int(block, 16)
+                params = [{'from': self.ethereum_tester.get_accounts()[-1], **params[0]}, block]
+            try:
+                responses.append(self.make_request(method, params))
+            except Exception as e:
+                responses.append({'jsonrpc': '2.0', 'id': i, 'error': {'code': -32000, 'message': str(e)}})
+        return responses
+
+
+def new_w3():
+    return Web3(BatchingTesterProvider())
+
+
+def deploy(w3, name, *args):
+    """Deploy a fixture contract from tests/fixtures/contracts/<name>.json"""
+    with open(os.path.join(CONTRACTS, f'{name}.json')) as f:
+        artifact = json.load(f)
+    contract = w3.eth.contract(abi=artifact['abi'], bytecode=artifact['bytecode'])
+    txid = contract.constructor(*args).transact({'from': w3.eth.accounts[0]})
+    address = w3.eth.wait_for_transaction_receipt(txid).contractAddress
+    return w3.eth.contract(address=address, abi=artifact['abi'])
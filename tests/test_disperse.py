@@ -0,0 +1,171 @@
+"""
+Disperse payouts on a local EVM (eth-tester with py-evm) with the fixture contracts in
+tests/fixtures/contracts: Disperse, an ERC20 token and a contract recipient which needs
+more than the 2300 gas stipend. Transactions are signed and sent as in payouts.
+"""
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('eth_tester')
+
+from app.config import config
+from app.disperse import disperse_ether_transactions, disperse_token_approval, disperse_token_transactions
+from app.payouts import make_payout_results, send_raw_transactions, sign_transactions
+from local_evm import deploy, new_w3
+
+
+# eth-tester funds the accounts of private keys 1, 2, ...
+SENDER_KEY = b'\0' * 31 + b'\1'
+MAX_GAS = 300000
+
+
+class Chain:
+    def __init__(self):
+        self.w3 = new_w3()
+        self.sender = self.w3.eth.accounts[0]
+        self.disperse = deploy(self.w3, 'Disperse')
+        self.token = deploy(self.w3, 'Token', 10 ** 24)
+        self.receiver = deploy(self.w3, 'Receiver')
+
+    def new_accounts(self, count):
+        return [self.w3.eth.account.create().address for _ in range(count)]
+
+    def send(self, transactions):
+        """Fill nonces and fees like the payout code, sign and broadcast in batches"""
+        nonce = self.w3.eth.get_transaction_count(self.sender)
+        for i, transaction in enumerate(transactions):
+            transaction.update({'nonce': nonce + i, 'maxFeePerGas': 10 ** 10, 'maxPriorityFeePerGas': 1,
+                                'chainId': self.w3.eth.chain_id})
+        return send_raw_transactions(sign_transactions(SENDER_KEY, transactions), provider=self.w3)
+
+    def receipt(self, txid):
+        return self.w3.eth.get_transaction_receipt(txid)
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    chain = Chain()
+    monkeypatch.setitem(config, 'DISPERSE_ADDRESS', chain.disperse.address)
+    monkeypatch.setitem(config, 'DISPERSE_MAX_GAS', MAX_GAS)
+    return chain
+
+
+def covered_rows(groups):
+    return sorted(i for group in groups for i in group)
+
+
+def test_ether_chunks_fit_and_pay_every_row(chain):
+    w3 = chain.w3
+    holders = chain.new_accounts(4)
+    chain.send([{'to': holder, 'value': 1, 'gas': 21000} for holder in holders])
+    recipients = chain.new_accounts(8) + holders + [chain.receiver.address]
+    values = [10 ** 15 + i for i in range(len(recipients))]
+    payout_gas = [(21000, w3.eth.get_balance(recipient) > 0) for recipient in recipients[:-1]]
+    payout_gas.append((w3.eth.estimate_gas({'from': chain.sender, 'to': chain.receiver.address, 'value': 1}), None))
+
+    groups, transactions = disperse_ether_transactions(recipients, values, payout_gas, Decimal(1))
+
+    assert covered_rows(groups) == list(range(len(recipients)))
+    # the contract recipient gets a plain transfer with its own estimate
+    assert [len(recipients) - 1] in groups
+    assert sum(1 for transaction in transactions if transaction['to'] == chain.disperse.address) > 1
+    assert all(transaction['gas'] <= MAX_GAS for transaction in transactions)
+
+    balances = [w3.eth.get_balance(recipient) for recipient in recipients[:-1]]
+    sent = chain.send(transactions)
+    assert [error for txid, error in sent] == [None] * len(transactions)
+    for (txid, error), transaction in zip(sent, transactions):
+        receipt = chain.receipt(txid)
+        # the gas model of the rows was enough without any multiplier
+        assert receipt.status == 1 and receipt.gasUsed <= transaction['gas']
+    for recipient, value, balance in zip(recipients, values, balances):
+        assert w3.eth.get_balance(recipient) == balance + value
+    assert chain.receiver.functions.received().call() == values[-1]
+    assert w3.eth.get_balance(chain.disperse.address) == 0
+
+
+def test_token_payout_approves_first_and_pays_every_row(chain):
+    holders = chain.new_accounts(3)
+    for holder in holders:
+        chain.token.functions.transfer(holder, 1).transact({'from': chain.sender})
+    recipients = chain.new_accounts(6) + holders
+    values = [10 ** 18 + i for i in range(len(recipients))]
+    payout_gas = []
+    for recipient, value in zip(recipients, values):
+        gas = chain.token.functions.transfer(recipient, value).estimate_gas({'from': chain.sender})
+        payout_gas.append((gas, chain.token.functions.balanceOf(recipient).call() > 0))
+
+    groups, transactions = disperse_token_transactions(chain.token.address, recipients, values, payout_gas, Decimal(1))
+    approval = disperse_token_approval(chain.token, chain.sender, sum(values), Decimal(1))
+    assert approval is not None and approval['to'] == chain.token.address
+    groups.insert(0, [])
+    transactions.insert(0, approval)
+
+    assert covered_rows(groups) == list(range(len(recipients)))
+    assert len(groups) > 2
+    assert all(transaction['gas'] <= MAX_GAS for transaction in transactions)
+
+    balances = [chain.token.functions.balanceOf(recipient).call() for recipient in recipients]
+    sent = chain.send(transactions)
+    for (txid, error), transaction in zip(sent, transactions):
+        receipt = chain.receipt(txid)
+        assert error is None and receipt.status == 1 and receipt.gasUsed <= transaction['gas']
+    for recipient, value, balance in zip(recipients, values, balances):
+        assert chain.token.functions.balanceOf(recipient).call() == balance + value
+    assert chain.token.functions.allowance(chain.sender, chain.disperse.address).call() == 0
+
+    payout_list = [{'dest': recipient, 'amount': Decimal(value) / 10 ** 18} for recipient, value in zip(recipients, values)]
+    results = make_payout_results(payout_list, sent, groups)
+    for group, (txid, error) in zip(groups, sent):
+        for i in group:
+            assert results[i]['status'] == 'success' and results[i]['txids'] == [txid[2:]]
+
+
+def test_no_approval_when_the_allowance_covers_the_total(chain):
+    chain.token.functions.approve(chain.disperse.address, 1000).transact({'from': chain.sender})
+    assert disperse_token_approval(chain.token, chain.sender, 1000, Decimal(1)) is None
+    assert disperse_token_approval(chain.token, chain.sender, 1001, Decimal(1)) is not None
+
+
+def test_reverted_chunk_maps_to_all_of_its_rows(chain):
+    recipients = chain.new_accounts(12)
+    values = [10 ** 18] * len(recipients)
+    gas = chain.token.functions.transfer(recipients[0], values[0]).estimate_gas({'from': chain.sender})
+    payout_gas = [(gas, False)] * len(recipients)
+    groups, transactions = disperse_token_transactions(chain.token.address, recipients, values, payout_gas, Decimal(1))
+    assert len(groups) > 1
+    # the allowance covers only the first chunk, transferFrom of the second one fails on-chain
+    chain.token.functions.approve(chain.disperse.address, sum(values[i] for i in groups[0])).transact({'from': chain.sender})
+
+    sent = chain.send(transactions)
+    assert chain.receipt(sent[0][0]).status == 1
+    assert chain.receipt(sent[1][0]).status == 0
+    payout_list = [{'dest': recipient, 'amount': Decimal(1)} for recipient in recipients]
+    results = make_payout_results(payout_list, sent, groups)
+    # SHKeeper follows the chunk txid of every row, all rows of the reverted chunk share it
+    assert {results[i]['txids'][0] for i in groups[1]} == {sent[1][0][2:]}
+    assert all(chain.token.functions.balanceOf(recipients[i]).call() == 0 for i in groups[1])
+    assert all(chain.token.functions.balanceOf(recipients[i]).call() == values[i] for i in groups[0])
+
+
+def test_rejected_chunk_fails_all_of_its_rows(chain, monkeypatch):
+    monkeypatch.setitem(config, 'PAYOUT_SEND_BATCH_SIZE', 1)
+    w3 = chain.w3
+    recipients = chain.new_accounts(12)
+    balance = w3.eth.get_balance(chain.sender)
+    # the second chunk pays more than the sender has, the node does not accept it
+    values = [10 ** 15] * 6 + [balance // 2] * 6
+    groups, transactions = disperse_ether_transactions(recipients, values, [(21000, False)] * len(recipients), Decimal(1))
+    assert len(groups) > 2
+
+    sent = chain.send(transactions)
+    payout_list = [{'dest': recipient, 'amount': Decimal(value) / 10 ** 18} for recipient, value in zip(recipients, values)]
+    results = make_payout_results(payout_list, sent, groups)
+    failed = next(n for n, (txid, error) in enumerate(sent) if error)
+    assert 'enough balance' in sent[failed][1]
+    for n, group in enumerate(groups):
+        for i in group:
+            assert results[i]['status'] == ('success' if n < failed else 'error')
+            if n > failed:
+                assert results[i]['msg'] == "Not sent, an earlier transaction failed"
@@ -0,0 +1,81 @@
+"""
+NewHeadsListener against a local stand-in WebSocket node emitting synthetic heads.
+"""
+import threading
+import time
+
+import pytest
+
+from app.config import config
+from app.heads import NewHeadsListener
+from ws_stand_in import StandInWsNode
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def node(monkeypatch):
+    monkeypatch.setitem(config, 'FULLNODE_WS_RECONNECT_SECONDS', 0)
+    monkeypatch.setitem(config, 'FULLNODE_WS_HEAD_TIMEOUT', 30)
+    return StandInWsNode()
+
+
+def subscribed_listener(node):
+    listener = NewHeadsListener(node.url).start()
+    assert wait_for(lambda: listener.connected)
+    return listener
+
+
+def test_head_wakes_up_the_scanner(node):
+    listener = subscribed_listener(node)
+    node.emit_head(100)
+    assert wait_for(lambda: listener.block_number() == 100)
+    # the scanner handles head 100 and waits for the next one
+    listener.wait(10)
+
+    woken_at = []
+    waiter = threading.Thread(target=lambda: (listener.wait(10), woken_at.append(time.time())))
+    waiter.start()
+    time.sleep(0.2)
+    emitted_at = time.time()
+    node.emit_head(101)
+    waiter.join(5)
+    assert woken_at and 0 <= woken_at[0] - emitted_at < 1
+    assert listener.block_number() == 101
+
+
+def test_dropped_socket_falls_back_to_polling_and_resubscribes(node):
+    listener = subscribed_listener(node)
+    node.emit_head(100)
+    assert wait_for(lambda: listener.block_number() == 100)
+
+    node.drop()
+    assert wait_for(lambda: listener.block_number() is None)
+    # while the subscription is down wait() sleeps the polling interval
+    started = time.time()
+    listener.wait(0.3)
+    assert 0.3 <= time.time() - started < 1
+
+    assert wait_for(lambda: node.subscriptions == 2 and listener.connected)
+    node.emit_head(105)
+    assert wait_for(lambda: listener.block_number() == 105)
+
+
+def test_stale_head_falls_back_to_polling(node, monkeypatch):
+    monkeypatch.setitem(config, 'FULLNODE_WS_HEAD_TIMEOUT', 1)
+    listener = subscribed_listener(node)
+    node.emit_head(100)
+    assert wait_for(lambda: listener.block_number() == 100)
+    # the socket is open but heads stopped coming
+    assert wait_for(lambda: listener.block_number() is None, timeout=3)
+    assert listener.connected
+    started = time.time()
+    listener.wait(0.3)
+    assert time.time() - started < 1
@@ -0,0 +1,104 @@
+"""
+Balance snapshots with the aggregate3 encoding of app.multicall on a local EVM (eth-tester
+with py-evm), against the Multicall3 and ERC20 token fixtures of tests/fixtures/contracts.
+The Disperse fixture stands for a token whose balanceOf reverts.
+"""
+import pytest
+
+pytest.importorskip('eth_tester')
+
+from web3 import Web3
+
+from app.config import config
+from app.multicall import CALL_SIZE, _aggregate3_calldata, _aggregate3_results, get_balance_snapshot
+from local_evm import deploy, new_w3
+
+
+CALLS_PER_CHUNK = 5
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    w3 = new_w3()
+    multicall = deploy(w3, 'Multicall3')
+    token = deploy(w3, 'Token', 10 ** 24)
+    broken = deploy(w3, 'Disperse')
+    monkeypatch.setitem(config, 'MULTICALL3_ADDRESS', multicall.address)
+    monkeypatch.setitem(config, 'TOKENS', {config['CURRENT_OP_NETWORK']: {
+        'TKN': {'contract_address': token.address},
+        'BROKEN': {'contract_address': broken.address},
+    }})
+    monkeypatch.setitem(config, 'MULTICALL_MAX_CALLDATA', CALLS_PER_CHUNK * CALL_SIZE)
+    monkeypatch.setitem(config, 'MULTICALL_BATCH_SIZE', 2)
+    return w3, multicall, token, broken
+
+
+def fund(w3, token, accounts):
+    sender = w3.eth.accounts[0]
+    for i, account in enumerate(accounts):
+        if i % 2 == 0:
+            w3.eth.send_transaction({'from': sender, 'to': account, 'value': 10 ** 15 * (i + 1)})
+        if i % 3 == 0:
+            token.functions.transfer(account, 10 ** 18 + i).transact({'from': sender})
+
+
+def single_calls(w3, token, account):
+    return {config['COIN_SYMBOL']: w3.eth.get_balance(account), 'TKN': token.functions.balanceOf(account).call(),
+            # the failed call is allowed and does not fail the others
+            'BROKEN': None}
+
+
+# 3 calls per account: within one chunk, ending one call after a chunk, filling chunks exactly, in the middle
+@pytest.mark.parametrize('accounts_count', [1, 2, 5, 8])
+def test_snapshot_matches_single_calls(chain, accounts_count):
+    w3, multicall, token, broken = chain
+    accounts = [w3.eth.account.create().address for _ in range(accounts_count - 1)] + [w3.eth.accounts[0]]
+    fund(w3, token, accounts[:-1])
+
+    snapshot = get_balance_snapshot(accounts, provider=w3)
+
+    assert snapshot.block_number == w3.eth.block_number
+    assert snapshot.assets == [config['COIN_SYMBOL'], 'TKN', 'BROKEN']
+    assert [account for account, row in snapshot.rows()] == accounts
+    for account, row in snapshot.rows():
+        assert row == single_calls(w3, token, account)
+
+
+def test_snapshot_is_pinned_to_the_block(chain):
+    w3, multicall, token, broken = chain
+    accounts = [w3.eth.account.create().address for _ in range(4)]
+    fund(w3, token, accounts)
+    block_number = w3.eth.block_number
+    before = [[w3.eth.get_balance(account), token.functions.balanceOf(account).call(), None] for account in accounts]
+    fund(w3, token, accounts)
+
+    snapshot = get_balance_snapshot(accounts, block_number, provider=w3)
+    assert snapshot.balances == before
+
+
+def test_full_chunk_size(chain):
+    w3, multicall, token, broken = chain
+    argument = bytes.fromhex(w3.eth.accounts[0][2:]).rjust(32, b'\0')
+    calls = [(bytes.fromhex(token.address[2:]), True, b'\x70\xa0\x82\x31' + argument)] * CALLS_PER_CHUNK
+    data = bytes.fromhex(_aggregate3_calldata(calls)[2:])
+    # selector, offset and length of the array, then CALL_SIZE per call
+    assert len(data) == 4 + 64 + config['MULTICALL_MAX_CALLDATA']
+    results = _aggregate3_results(w3.eth.call({'to': multicall.address, 'data': data}))
+    assert results == [(True, token.functions.balanceOf(w3.eth.accounts[0]).call().to_bytes(32, 'big'))] * CALLS_PER_CHUNK
+
+
+def test_calldata_matches_the_abi_encoding(chain):
+    w3, multicall, token, broken = chain
+    calls = [(bytes.fromhex(token.address[2:]), True, b'\x70\xa0\x82\x31' + b'\0' * 32),
+             (bytes.fromhex(broken.address[2:]), False, b''),
+             (bytes.fromhex(multicall.address[2:]), True, b'\x01' * 45)]
+    expected = multicall.encode_abi('aggregate3', args=[[(Web3.to_checksum_address(target), allow_failure, data)
+                                                          for target, allow_failure, data in calls]])
+    assert _aggregate3_calldata(calls) == expected
+
+
+def test_call_which_may_not_fail_reverts_the_chunk(chain):
+    w3, multicall, token, broken = chain
+    calls = [(bytes.fromhex(broken.address[2:]), False, b'\x70\xa0\x82\x31' + b'\0' * 32)]
+    with pytest.raises(Exception, match='Multicall3: call failed'):
+        w3.eth.call({'to': multicall.address, 'data': _aggregate3_calldata(calls)})
@@ -0,0 +1,160 @@
+"""
+NonceManager and its Lua scripts on fakeredis. Every manager gets its own client of one
+fake server, as processes sharing Redis do. The node's pending count is set by the tests.
+"""
+import threading
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+
+from app import nonces
+from app.config import config
+from app.nonces import NonceManager
+
+
+SENDER = '0x' + '11' * 20
+
+
+class Node:
+    def __init__(self):
+        self.pending = 10
+
+
+@pytest.fixture
+def node():
+    return Node()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1700000000.0]
+    monkeypatch.setattr(nonces.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def new_manager(monkeypatch, node):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(nonces.redis.Redis, 'from_url', lambda *args, **kwargs: fakeredis.FakeRedis(server=server))
+
+    def new_manager():
+        manager = NonceManager(SENDER)
+        manager.pending_count = lambda: node.pending
+        return manager
+    return new_manager
+
+
+def test_first_reservation_starts_at_the_pending_count(new_manager):
+    manager = new_manager()
+    assert manager.reserve(3) == [10, 11, 12]
+    assert manager.reserve() == [13]
+    assert not manager.redis_failed
+
+
+def test_concurrent_reservations_never_share_a_nonce(new_manager):
+    managers = [new_manager() for _ in range(8)]
+    reserved = []
+    lock = threading.Lock()
+
+    def reserve(manager):
+        for count in (1, 3, 2) * 10:
+            got = manager.reserve(count)
+            with lock:
+                reserved.extend(got)
+
+    threads = [threading.Thread(target=reserve, args=(manager,)) for manager in managers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(reserved) == list(range(10, 10 + 8 * 60))
+
+
+def test_released_nonces_are_reused_lowest_first(new_manager):
+    manager = new_manager()
+    assert manager.reserve(5) == [10, 11, 12, 13, 14]
+    new_manager().release([13, 11])
+    assert manager.reserve() == [11]
+    # the rest of the released ones first, then a new range
+    assert manager.reserve(3) == [13, 15, 16]
+    assert manager.reserve() == [17]
+
+
+def test_resync_moves_up_to_the_pending_count(new_manager, node):
+    manager = new_manager()
+    manager.reserve(2)
+    manager.release([11])
+    # transactions of this sender were sent elsewhere
+    node.pending = 20
+    assert manager.resync() == 20
+    # nonces below the pending count are not handed out again
+    assert manager.reserve(2) == [20, 21]
+
+
+def test_resync_keeps_nonces_above_the_pending_count(new_manager, node):
+    manager = new_manager()
+    manager.reserve(4)
+    # 10 and 11 are mined, 12 and 13 may still be on their way
+    node.pending = 12
+    assert manager.resync() == 14
+    assert manager.reserve() == [14]
+
+
+def test_released_gap_is_not_waited_for(new_manager, node):
+    manager = new_manager()
+    manager.reserve(3)
+    manager.release([10])
+    # the node is stuck at 10, which is released and will be sent again
+    assert manager.resync() == 13
+    assert manager.reserve() == [10]
+
+
+def test_gap_is_closed_after_nonce_gap_seconds(new_manager, node, clock):
+    manager = new_manager()
+    manager.reserve(3)
+    # 10 was reserved but never broadcast, 11 and 12 cannot be mined
+    assert manager.resync() == 13
+    clock[0] += config['NONCE_GAP_SECONDS'] - 1
+    assert manager.resync() == 13
+    assert manager.reserve() == [13]
+    clock[0] += 1
+    assert manager.resync() == 10
+    assert manager.reserve(4) == [10, 11, 12, 13]
+
+
+def test_gap_timer_restarts_when_the_node_moves(new_manager, node, clock):
+    manager = new_manager()
+    manager.reserve(3)
+    manager.resync()
+    clock[0] += config['NONCE_GAP_SECONDS'] - 1
+    # 10 got mined, now the node waits for 11
+    node.pending = 11
+    assert manager.resync() == 13
+    clock[0] += config['NONCE_GAP_SECONDS'] - 1
+    assert manager.resync() == 13
+    clock[0] += 1
+    assert manager.resync() == 11
+
+
+def test_settle_releases_only_certain_rejections(new_manager, node):
+    manager = new_manager()
+    manager.reserve(6)
+    manager.settle([10, 11, 12, 13, 14, 15], [
+        None,
+        "already known",
+        "replacement transaction underpriced",
+        "{'code': -32000, 'message': 'insufficient funds for gas * price + value'}",
+        "Broadcast result of 0xab is unknown: Read timed out",
+        "Not sent, an earlier transaction failed",
+    ])
+    assert manager.reserve(3) == [13, 15, 16]
+
+
+def test_settle_resyncs_on_nonce_too_low(new_manager, node):
+    manager = new_manager()
+    manager.reserve(2)
+    node.pending = 30
+    manager.settle([10, 11], ["nonce too low", "Not sent, an earlier transaction failed"])
+    assert manager.reserve() == [30]
@@ -0,0 +1,131 @@
+"""
+RpcClient hedging, circuit breaking, writes and pinning against local stand-in fullnodes.
+"""
+import json
+import time
+
+import pytest
+
+from app import rpc
+from app.config import config
+from app.rpc import RpcClient
+from http_stand_in import StandInHttpNode
+
+
+@pytest.fixture
+def nodes(monkeypatch):
+    monkeypatch.setitem(config, 'RPC_HEDGE_DELAY', 0.05)
+    monkeypatch.setitem(config, 'RPC_BREAKER_FAILURES', 3)
+    monkeypatch.setitem(config, 'RPC_BREAKER_RESET_SECONDS', 1)
+    # no random exploration, endpoints are tried in the ranked order
+    monkeypatch.setattr(rpc.random, 'random', lambda: 1)
+    started = []
+
+    def start(*args, **kwargs):
+        node = StandInHttpNode(*args, **kwargs)
+        started.append(node)
+        return node
+    yield start
+    for node in started:
+        node.stop()
+
+
+def call(client, method):
+    data = json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': []}).encode()
+    return client.post(data).json()['result']
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_hedge_wins_over_a_slow_endpoint(nodes):
+    slow = nodes('slow', delay=1)
+    fast = nodes('fast', delay=0.01)
+    client = RpcClient([slow.url, fast.url])
+    started = time.time()
+    assert call(client, 'eth_getBlockByNumber') == 'fast'
+    assert time.time() - started < 0.5
+    assert slow.methods == fast.methods == ['eth_getBlockByNumber']
+
+    # the lost request is recorded only up to the answer of the winner
+    slow_endpoint, fast_endpoint = client.endpoints
+    assert wait_for(lambda: slow_endpoint.latencies)
+    assert slow_endpoint.latency < 0.5
+    # and it does not push the slow endpoint above a steadily faster one
+    assert client.ranked()[0] is fast_endpoint
+
+
+def test_methods_which_are_not_hedged_wait_for_the_endpoint(nodes):
+    slow = nodes('slow', delay=0.3)
+    fast = nodes('fast')
+    client = RpcClient([slow.url, fast.url])
+    assert call(client, 'eth_chainId') == 'slow'
+    assert not fast.methods
+
+
+def test_breaker_opens_after_failures_and_resets(nodes):
+    broken = nodes('broken', failing=True)
+    healthy = nodes('healthy')
+    client = RpcClient([broken.url, healthy.url])
+    broken_endpoint = client.endpoints[0]
+
+    for _ in range(config['RPC_BREAKER_FAILURES']):
+        # failed requests are retried on the other endpoint
+        assert call(client, 'eth_chainId') == 'healthy'
+    assert len(broken.methods) == config['RPC_BREAKER_FAILURES']
+    assert not broken_endpoint.available()
+    for _ in range(5):
+        assert call(client, 'eth_chainId') == 'healthy'
+    assert len(broken.methods) == config['RPC_BREAKER_FAILURES']
+
+    time.sleep(config['RPC_BREAKER_RESET_SECONDS'])
+    assert broken_endpoint.available()
+    assert call(client, 'eth_chainId') == 'healthy'
+    # tried once more, one failure opens the breaker again
+    assert len(broken.methods) == config['RPC_BREAKER_FAILURES'] + 1
+    assert not broken_endpoint.available()
+
+    broken.failing = False
+    time.sleep(config['RPC_BREAKER_RESET_SECONDS'])
+    assert call(client, 'eth_chainId') == 'broken'
+    assert broken_endpoint.available() and broken_endpoint.failures == 0
+
+
+def test_writes_go_only_to_the_primary(nodes):
+    primary = nodes('primary', delay=0.2)
+    other = nodes('other')
+    client = RpcClient([primary.url, other.url])
+    for _ in range(3):
+        assert call(client, 'eth_sendRawTransaction') == 'primary'
+    assert not other.methods
+
+    primary.failing = True
+    with pytest.raises(Exception):
+        call(client, 'eth_sendRawTransaction')
+    assert not other.methods
+
+
+def test_pinned_reads_stay_on_one_endpoint(nodes):
+    behind = nodes('behind', head=100)
+    synced = nodes('synced', head=200, delay=0.1)
+    ahead = nodes('ahead', head=300)
+    client = RpcClient([behind.url, synced.url, ahead.url])
+
+    with client.pinned(150) as head:
+        # the first ranked endpoint which has block 150
+        assert head == 200
+        # hedged methods are not hedged here, even when the endpoint is slow
+        assert {call(client, method) for method in ('eth_getBlockByNumber', 'eth_getLogs', 'eth_chainId')} == {'synced'}
+    assert synced.methods == ['eth_blockNumber', 'eth_getBlockByNumber', 'eth_getLogs', 'eth_chainId']
+    assert behind.methods == ['eth_blockNumber'] and not ahead.methods
+
+    with client.pinned(1000) as head:
+        # nobody has the block, the highest endpoint is used
+        assert head == 300
+        assert call(client, 'eth_getLogs') == 'ahead'
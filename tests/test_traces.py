@@ -0,0 +1,93 @@
+"""
+Trace mode against a debug_traceBlockByNumber callTracer result in the format of geth,
+tests/fixtures/trace_block.json. Our accounts are 0x1111...11 and 0x2222...22.
+"""
+import json
+import os
+
+from app.address_index import AddressIndex
+from app.traces import flatten_value_transfers, get_transfers_from_traces, trace_blocks
+
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'trace_block.json')
+OURS_A = bytes.fromhex('11' * 20)
+OURS_B = bytes.fromhex('22' * 20)
+E17 = 10 ** 17
+
+
+def load_traces():
+    with open(FIXTURE) as f:
+        return json.load(f)
+
+
+def our_accounts():
+    accounts = AddressIndex()
+    accounts.add(OURS_A)
+    accounts.add(OURS_B)
+    return accounts
+
+
+def test_reverted_frames_are_skipped_with_their_subcalls():
+    traces = load_traces()
+    transfers = list(flatten_value_transfers(traces[0]['result']))
+    # the 5e17 CALL inside the reverted frame is missing, DELEGATECALL and STATICCALL move no ETH
+    assert transfers == [('0x' + '11' * 20, E17), ('0x' + '11' * 20, 2 * E17), ('0x' + '33' * 20, E17)]
+    # a reverted transaction moves nothing
+    assert list(flatten_value_transfers(traces[4]['result'])) == []
+
+
+def test_top_frame_is_not_an_internal_transfer():
+    assert list(flatten_value_transfers(load_traces()[1]['result'])) == []
+
+
+def test_selfdestruct_and_create_value():
+    traces = load_traces()
+    assert list(flatten_value_transfers(traces[2]['result'])) == [('0x' + '22' * 20, 4 * E17)]
+    # value of the failed CREATE2 stays with the factory
+    assert list(flatten_value_transfers(traces[3]['result'])) == [('0x' + '11' * 20, 5 * E17)]
+
+
+def test_transfers_are_summed_per_transaction_and_address():
+    transfers = get_transfers_from_traces(load_traces(), [], our_accounts())
+    assert sorted(transfers) == sorted([
+        ('aa' * 32, OURS_A, 3 * E17),
+        ('cc' * 32, OURS_B, 4 * E17),
+        ('dd' * 32, OURS_A, 5 * E17),
+    ])
+
+
+def test_transactions_without_tx_hash_take_it_from_the_block():
+    traces = load_traces()
+    for trace in traces:
+        del trace['txHash']
+    tx_hashes = ['0x' + '%02x' % i * 32 for i in range(len(traces))]
+    transfers = get_transfers_from_traces(traces, tx_hashes, our_accounts())
+    assert sorted(txid for txid, address, value in transfers) == ['00' * 32, '02' * 32, '03' * 32]
+
+
+class FakeBlock:
+    def __init__(self, number, tx_hashes):
+        self.number = number
+        self.transactions = [type('Tx', (), {'hash': tx_hash}) for tx_hash in tx_hashes]
+
+
+class FakeProvider:
+    """Answers the debug_traceBlockByNumber batch of trace_blocks() with the fixture"""
+
+    def __init__(self):
+        self.requests = []
+        self.provider = self
+
+    def make_batch_request(self, requests):
+        self.requests.append(requests)
+        return [{'jsonrpc': '2.0', 'id': i, 'result': load_traces()} for i, request in enumerate(requests)]
+
+
+def test_trace_blocks_sends_one_batch_for_blocks_with_transactions():
+    provider = FakeProvider()
+    blocks = [FakeBlock(100, ['0x' + 'aa' * 32]), FakeBlock(101, []), FakeBlock(102, ['0x' + 'bb' * 32])]
+    transfers = trace_blocks(provider, blocks, our_accounts())
+    assert provider.requests == [[('debug_traceBlockByNumber', ['0x64', {'tracer': 'callTracer'}]),
+                                  ('debug_traceBlockByNumber', ['0x66', {'tracer': 'callTracer'}])]]
+    assert set(transfers) == {100, 102}
+    assert ('aa' * 32, OURS_A, 3 * E17) in transfers[100]
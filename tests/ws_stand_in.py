@@ -0,0 +1,78 @@
+import asyncio
+import json
+import threading
+
+from websockets.asyncio.server import serve
+
+
+SUBSCRIPTION_ID = '0x9cef478923ff08bf67fde6c64013158d'
+
+
+def make_head(number):
+    return {'number': hex(number), 'hash': '0x' + f'{number:064x}', 'parentHash': '0x' + f'{number - 1:064x}',
+            'nonce': '0x0000000000000000', 'sha3Uncles': '0x' + '00' * 32, 'logsBloom': '0x' + '00' * 256,
+            'transactionsRoot': '0x' + '00' * 32, 'stateRoot': '0x' + '00' * 32, 'receiptsRoot': '0x' + '00' * 32,
+            'miner': '0x' + '42' * 20, 'difficulty': '0x0', 'extraData': '0x', 'gasLimit': '0x1c9c380',
+            'gasUsed': '0x0', 'timestamp': hex(1700000000 + number * 2), 'baseFeePerGas': '0x1',
+            'mixHash': '0x' + '00' * 32}
+
+
+class StandInWsNode:
+    """
+    Local WebSocket fullnode which accepts eth_subscribe newHeads and emits synthetic heads
+    on emit_head(). drop() closes the open connections, as a restarting node would.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.connections = set()
+        self.subscriptions = 0
+        started = threading.Event()
+        threading.Thread(daemon=True, name="WS stand-in node", target=self._run, args=(started,)).start()
+        started.wait(5)
+        self.url = f'ws://127.0.0.1:{self.port}'
+
+    def _run(self, started):
+        asyncio.set_event_loop(self.loop)
+
+        async def start():
+            self.server = await serve(self._handle, '127.0.0.1', 0)
+            self.port = self.server.sockets[0].getsockname()[1]
+            started.set()
+
+        self.loop.run_until_complete(start())
+        self.loop.run_forever()
+
+    async def _handle(self, connection):
+        async for message in connection:
+            request = json.loads(message)
+            if request['method'] == 'eth_subscribe' and request['params'][0] == 'newHeads':
+                self.connections.add(connection)
+                self.subscriptions += 1
+                response = {'jsonrpc': '2.0', 'id': request['id'], 'result': SUBSCRIPTION_ID}
+            elif request['method'] == 'eth_unsubscribe':
+                self.connections.discard(connection)
+                response = {'jsonrpc': '2.0', 'id': request['id'], 'result': True}
+            else:
+                response = {'jsonrpc': '2.0', 'id': request['id'],
+                            'error': {'code': -32601, 'message': f"method {request['method']} is not supported"}}
+            await connection.send(json.dumps(response))
+        self.connections.discard(connection)
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(5)
+
+    def emit_head(self, number):
+        async def emit():
+            message = json.dumps({'jsonrpc': '2.0', 'method': 'eth_subscription',
+                                  'params': {'subscription': SUBSCRIPTION_ID, 'result': make_head(number)}})
+            for connection in list(self.connections):
+                await connection.send(message)
+        self._call(emit())
+
+    def drop(self):
+        async def close():
+            for connection in list(self.connections):
+                await connection.close()
+            self.connections.clear()
+        self._call(close())